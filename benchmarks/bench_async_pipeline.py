@@ -0,0 +1,55 @@
+"""
+Compares the throughput of solving a stream of screenshots one after the other in a plain loop
+with the asyncio pipeline, which overlaps decoding, solving and writing, see src.async_pipeline.
+The screenshots are synthetic puzzles, written as JPEGs into a temporary directory.
+
+Run from the root directory with `python -m benchmarks.bench_async_pipeline`.
+"""
+import logging
+import os
+import tempfile
+import time
+from benchmarks.puzzle_generator import generate_puzzle
+from src.async_pipeline import _write, run_pipeline
+from src.image_manipulation import Image
+from src.solution_base import Solution
+from src.solver_naive import naive_method
+
+
+def sequential_loop(files, output_format: str, output_dir: str) -> None:
+    # The way main solved the images before the process pool, one stage after the other:
+    os.makedirs(output_dir, exist_ok=True)
+    for file_name in files:
+        solution = Solution(Image(file_name))
+        solution.solve(naive_method)
+        _write(file_name, solution.steps, output_format, output_dir)
+
+
+if __name__ == '__main__':
+    logging.disable(logging.INFO)
+    print(f'{os.cpu_count()} CPUs')
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for N_i, N_j, n_files in ((8, 10, 24), (12, 16, 12)):
+            files = []
+            for k in range(n_files):
+                file_name = os.path.join(tmp_dir, f'puzzle_{N_i}x{N_j}_{k}.jpeg')
+                generate_puzzle(N_i, N_j, seed=k).image.save(file_name, quality=90)
+                files.append(file_name)
+
+            for output_format in ('json', 'gif'):
+                output_dir = os.path.join(tmp_dir, 'solutions')
+                start = time.perf_counter()
+                sequential_loop(files, output_format, output_dir)
+                sequential = time.perf_counter() - start
+
+                start = time.perf_counter()
+                results = run_pipeline(files, output_format=output_format, output_dir=output_dir)
+                pipelined = time.perf_counter() - start
+                assert all(r[1] for r in results)
+
+                print(
+                    f'{n_files} {N_i}x{N_j} puzzles to {output_format}: '
+                    f'sequential {n_files / sequential:.2f} images/s, async pipeline {n_files / pipelined:.2f} images/s '
+                    f'(x{sequential / pipelined:.2f})'
+                )
@@ -0,0 +1,49 @@
+"""
+Compares the tiling detection on the full edge-filtered image with the one on a few scanlines,
+for all images in the images-folder, in their original size and upscaled to 4K.
+Also compares the FFTs one signal at a time with the batched FFT over the scanlines of many images.
+
+Run from the root directory with `python -m benchmarks.bench_count_tiling`.
+"""
+import glob
+import time
+import numpy as np
+from src.fourier_analysis import _get_major_frequency_from_array, get_major_frequencies_batched
+from src.image_manipulation import Image, PILImage, _tiling_scanlines
+
+
+def time_it(f, *args, **kwargs):
+    start = time.perf_counter()
+    result = f(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+if __name__ == '__main__':
+    for file_name in sorted(glob.glob('images/*.jpeg')):
+        image = Image(file_name).image
+        for scale in (1, 3):
+            scaled = image.resize((image.size[0] * scale, image.size[1] * scale)) if scale > 1 else image
+            t_full, tiling_full = time_it(Image.count_tiling, scaled, fast=False)
+            t_fast, tiling_fast = time_it(Image.count_tiling, scaled, fast=True)
+            print(
+                f'{file_name} {scaled.size}: full {tiling_full} in {t_full * 1e3:.1f} ms, '
+                f'scanlines {tiling_fast} in {t_fast * 1e3:.1f} ms, speedup {t_full / t_fast:.1f}x'
+            )
+
+    # Scanlines of a batch of 200 screenshots, in two different resolutions:
+    arrays = [Image(file_name).pixels for file_name in sorted(glob.glob('images/*.jpeg'))]
+    arrays.append(np.asarray(PILImage.fromarray(arrays[0]).resize((1080, 1675))))
+    signals = [
+        signal
+        for k in range(200)
+        for signals_per_axis in _tiling_scanlines(arrays[k % len(arrays)], 16)
+        for signal in signals_per_axis
+    ]
+
+    t_single, single = time_it(lambda: [_get_major_frequency_from_array(signal) for signal in signals])
+    t_batched, batched = time_it(get_major_frequencies_batched, signals)
+    assert (np.asarray(single) == batched).all()
+    print(
+        f'FFT of {len(signals)} scanlines: one by one {t_single * 1e3:.1f} ms, '
+        f'batched {t_batched * 1e3:.1f} ms, speedup {t_single / t_batched:.1f}x'
+    )
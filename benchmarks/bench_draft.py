@@ -0,0 +1,45 @@
+"""
+Compares the image analysis on fully decoded screenshots with the one on screenshots decoded
+at reduced resolution in draft mode, in runtime and in whether tiling, fixed tiles and tile colours agree.
+Runs on the images in the images-folder and on synthetic puzzles with tiles of different sizes.
+
+Run from the root directory with `python -m benchmarks.bench_draft`.
+"""
+import glob
+import io
+import logging
+import time
+from benchmarks.puzzle_generator import generate_puzzle
+from src.image_manipulation import Image
+
+
+def analyse(data: bytes, draft: bool):
+    start = time.perf_counter()
+    image = Image.from_bytes(data, draft=draft)
+    image.fixed_tiles, image.tile_colours
+    return image, time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    logging.disable(logging.INFO)
+
+    sources = []
+    for file_name in sorted(glob.glob('images/*.jpeg')):
+        with open(file_name, 'rb') as f:
+            sources.append((file_name, f.read()))
+    for N_i, N_j, tile_width, tile_height in [(5, 6, 200, 250), (8, 10, 90, 112), (12, 16, 60, 75), (6, 8, 330, 400)]:
+        fp = io.BytesIO()
+        generate_puzzle(N_i, N_j, tile_width=tile_width, tile_height=tile_height).image.save(fp, format='JPEG', quality=90)
+        sources.append((f'synthetic {N_i}x{N_j}, tiles of {tile_width}x{tile_height}', fp.getvalue()))
+
+    for name, data in sources:
+        full, full_time = min((analyse(data, False) for _ in range(3)), key=lambda r: r[1])
+        draft, draft_time = min((analyse(data, True) for _ in range(3)), key=lambda r: r[1])
+        agrees = (
+            full.tiling == draft.tiling and full.fixed_tiles == draft.fixed_tiles
+            and (full.tile_colours == draft.tile_colours).all()
+        )
+        print(
+            f'{name}: full {full_time * 1e3:.0f} ms, draft at 1/{draft.draft_scale} {draft_time * 1e3:.0f} ms, '
+            f'{"same" if agrees else "DIFFERENT"} results'
+        )
@@ -0,0 +1,96 @@
+"""
+Compares the methods of finding the final ordering on synthetic gradient puzzles of growing size,
+in terms of runtime and accuracy, i.e. the share of movable positions which got a tile of the correct colour,
+and the mean absolute colour error of the tiles placed on the movable positions.
+
+Run from the root directory with `python -m benchmarks.bench_final_ordering`.
+"""
+import time
+from types import SimpleNamespace
+from typing import Tuple
+import numpy as np
+from src.final_ordering import find_final_ordering, find_final_ordering_by_assignment
+
+
+def synthetic_puzzle(
+    N_i: int,
+    N_j: int,
+    seed: int = 0,
+    fixed: str = 'border',
+    noise: int = 0,
+    colour_range: Tuple[int, int] = (0, 256),
+) -> SimpleNamespace:
+    """
+    Creates an object with the attributes of an Image which find_final_ordering needs:
+    A bilinear gradient between four random corner colours from colour_range, with the border or
+    only the corner tiles fixed and all other tiles scrambled. Optionally, some uniform noise of
+    +/- noise is added to the tile colours. The colours without noise are stored in target_colours
+    (per position) and true_tile_colours (per tile), the correct solution in final_ordering.
+    """
+    rng = np.random.default_rng(seed)
+    corners = rng.integers(*colour_range, (2, 2, 3))
+    u = np.linspace(0, 1, N_i)[:, np.newaxis, np.newaxis]
+    v = np.linspace(0, 1, N_j)[np.newaxis, :, np.newaxis]
+    colours = np.round(
+        (1 - u) * (1 - v) * corners[0, 0] + u * (1 - v) * corners[1, 0]
+        + (1 - u) * v * corners[0, 1] + u * v * corners[1, 1]
+    ).astype(int)
+
+    if fixed == 'border':
+        fixed_tiles = [(i, j) for i in range(N_i) for j in range(N_j) if i in (0, N_i - 1) or j in (0, N_j - 1)]
+    else:
+        fixed_tiles = [(0, 0), (N_i - 1, 0), (0, N_j - 1), (N_i - 1, N_j - 1)]
+    fixed_tiles_set = set(fixed_tiles)
+    movable = np.asarray([(i, j) for i in range(N_i) for j in range(N_j) if (i, j) not in fixed_tiles_set])
+    scrambled = movable[rng.permutation(len(movable))]
+
+    # The tile at position movable[k] originally belongs to position scrambled[k]:
+    tile_colours = colours.copy()
+    tile_colours[movable[:, 0], movable[:, 1]] = colours[scrambled[:, 0], scrambled[:, 1]]
+    true_tile_colours = tile_colours.copy()
+    if noise > 0:
+        tile_colours = np.clip(tile_colours + rng.integers(-noise, noise + 1, tile_colours.shape), 0, 255)
+
+    final_ordering = np.stack(np.meshgrid(np.arange(N_i), np.arange(N_j), indexing='ij'), axis=-1)
+    final_ordering[scrambled[:, 0], scrambled[:, 1]] = movable
+
+    return SimpleNamespace(
+        tiling=(N_i, N_j),
+        fixed_tiles=fixed_tiles,
+        tile_colours=tile_colours,
+        final_ordering=final_ordering,
+        target_colours=colours,
+        true_tile_colours=true_tile_colours,
+        movable=movable,
+    )
+
+def accuracy(puzzle: SimpleNamespace, final_ordering: np.ndarray) -> Tuple[float, float]:
+    """
+    Returns the share of movable positions which got a tile of the correct colour
+    and the mean absolute colour error on the movable positions.
+    """
+    placed = puzzle.true_tile_colours[final_ordering[:, :, 0], final_ordering[:, :, 1]]
+    error = np.abs(placed - puzzle.target_colours)[puzzle.movable[:, 0], puzzle.movable[:, 1]]
+    return (error.max(axis=1) == 0).mean(), error.mean()
+
+
+METHODS = {
+    'greedy': lambda puzzle: find_final_ordering(puzzle, engine='bruteforce'),
+    'greedy_kdtree': lambda puzzle: find_final_ordering(puzzle, engine='kdtree'),
+    'assignment': find_final_ordering_by_assignment,
+}
+
+
+if __name__ == '__main__':
+    for fixed, noise in (('border', 0), ('border', 3), ('corners', 3)):
+        print(f'Fixed tiles: {fixed}, noise: +/-{noise}')
+        for N in (10, 30, 60):
+            puzzle = synthetic_puzzle(N, N, fixed=fixed, noise=noise)
+            results = []
+            for name, method in METHODS.items():
+                start = time.perf_counter()
+                final_ordering, _ = method(puzzle)
+                elapsed = time.perf_counter() - start
+                share_correct, colour_error = accuracy(puzzle, final_ordering)
+                results.append(f'{name} {elapsed * 1e3:.0f} ms / {100 * share_correct:.1f} % / error {colour_error:.2f}')
+            print(f'  {N}x{N} grid: ' + ', '.join(results))
@@ -0,0 +1,63 @@
+"""
+Compares writing the solution gif by collecting all frames and saving them at once with
+writing it frame by frame with the streaming writer, in runtime, file size and peak memory.
+Each variant runs in its own process, so that the peak resident memory can be compared.
+Also compares rendering the frames alone, from scratch for each state and incrementally.
+
+Run from the root directory with `python -m benchmarks.bench_gif`.
+"""
+import io
+import resource
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from benchmarks.bench_solver_naive import random_final_ordering
+from src.solver_naive import naive_method
+from src.state_visualisation import StateRenderer, _generate_state_image, write_solution_gif
+
+
+def random_solution(N: int):
+    final_ordering = random_final_ordering(N, N)
+    colouring = np.random.default_rng(0).integers(0, 256, (N, N, 3))
+    return naive_method(colouring, final_ordering)
+
+def save_all_at_once(steps, fp) -> None:
+    # The former way of generate_solution_gif:
+    images = [_generate_state_image(step) for step in steps]
+    images[0].save(fp, format='GIF', save_all=True, optimize=False, append_images=images[1:], loop=0, duration=len(images))
+
+def run(variant: str, N: int):
+    steps = random_solution(N)
+    fp = io.BytesIO()
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    if variant == 'save_all':
+        save_all_at_once(steps, fp)
+    else:
+        write_solution_gif(steps, fp, duration=len(steps))
+    elapsed = time.perf_counter() - start
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return len(steps), elapsed, len(fp.getvalue()), (rss_after - rss_before) / 1024
+
+def render_frames(steps, incremental: bool) -> float:
+    renderer = StateRenderer()
+    start = time.perf_counter()
+    for step in steps:
+        if incremental:
+            renderer.render(step)
+        else:
+            renderer.render_full(step)
+    return time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    for N in (6, 12, 24):
+        steps = random_solution(N)
+        full, incremental = render_frames(steps, False), render_frames(steps, True)
+        print(f'{N}x{N} grid, rendering {len(steps)} frames: full {full * 1e3:.0f} ms, incremental {incremental * 1e3:.0f} ms')
+
+    for N in (6, 12):
+        for variant in ('save_all', 'streaming'):
+            with ProcessPoolExecutor(max_workers=1) as executor:
+                n_steps, elapsed, size, peak = executor.submit(run, variant, N).result()
+            print(f'{N}x{N} grid, {n_steps} frames, {variant}: {elapsed * 1e3:.0f} ms, {size / 1e3:.0f} kB, peak memory +{peak:.0f} MB')
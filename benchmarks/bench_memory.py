@@ -0,0 +1,61 @@
+"""
+Measures the memory taken by the pipeline on synthetic screenshots of increasing size:
+the peak memory traced per stage and the size of the arrays a solution keeps, compared to
+storing the same arrays with the default int64, as well as the peak memory of the colour
+distances of is_single_colour on the full screenshot, compared to upcasting it to int first.
+
+Run from the root directory with `python -m benchmarks.bench_memory`.
+"""
+import logging
+import tracemalloc
+import numpy as np
+from benchmarks.puzzle_generator import generate_puzzle
+from src import instrumentation
+from src.image_manipulation import Image, is_single_colour
+from src.solution_base import Solution
+from src.solver_naive import naive_method
+
+
+def peak_memory(func, *args, **kwargs) -> int:
+    tracemalloc.start()
+    try:
+        func(*args, **kwargs)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def is_single_colour_upcast(matrix: np.ndarray, target_colour: np.ndarray) -> np.ndarray:
+    # is_single_colour as it was, with the whole input upcast to int:
+    return (np.abs(matrix.astype(int) - target_colour).mean(axis=2) <= 40.0).mean(axis=1) >= 1.0
+
+
+if __name__ == '__main__':
+    logging.disable(logging.INFO)
+
+    for N_i, N_j, tile_width, tile_height in [(5, 6, 90, 112), (8, 10, 90, 112), (12, 16, 90, 112)]:
+        pixels = np.asarray(generate_puzzle(N_i, N_j, tile_width=tile_width, tile_height=tile_height).image)
+        print(f'{N_i}x{N_j} tiles, screenshot of {pixels.shape[1]}x{pixels.shape[0]} pixels ({pixels.nbytes / 2 ** 20:.1f} MiB):')
+
+        black = np.zeros(3, dtype=np.uint8)
+        print(
+            f'  is_single_colour: peak {peak_memory(is_single_colour, pixels) / 2 ** 20:.1f} MiB, '
+            f'with upcast to int {peak_memory(is_single_colour_upcast, pixels, black) / 2 ** 20:.1f} MiB'
+        )
+
+        instrumentation.enable(trace_memory=True)
+        solution = Solution(Image.from_array(pixels))
+        solution.solve(naive_method)
+        instrumentation.disable()
+        print('  peak per stage: ' + ', '.join(
+            f'{r.stage} {r.peak_memory / 2 ** 20:.2f} MiB' for r in solution.stage_metrics
+        ))
+
+        arrays = {
+            'tile_colours': solution.initial_colouring,
+            'final_ordering': solution.final_ordering,
+            'final_colouring': solution.final_colouring,
+            'swaps': solution.steps.swaps,
+        }
+        print('  stored arrays: ' + ', '.join(
+            f'{name} {a.nbytes} B as {a.dtype} ({a.size * 8} B as int64)' for name, a in arrays.items()
+        ))
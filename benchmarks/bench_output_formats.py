@@ -0,0 +1,27 @@
+"""
+Compares the output formats of the solution in encoding time and size, so that the
+cheapest one can be picked per client. The move lists (json, swaps) leave the rendering
+to the client, so they are naturally much smaller and faster.
+
+Run from the root directory with `python -m benchmarks.bench_output_formats`.
+"""
+import io
+import time
+from benchmarks.bench_gif import random_solution
+from src.state_visualisation import OUTPUT_FORMATS
+
+
+def run(output_format: str, steps):
+    _, writer = OUTPUT_FORMATS[output_format]
+    fp = io.BytesIO()
+    start = time.perf_counter()
+    writer(steps, fp, duration=len(steps))
+    return time.perf_counter() - start, len(fp.getvalue())
+
+
+if __name__ == '__main__':
+    for N in (6, 12):
+        steps = random_solution(N)
+        for output_format in OUTPUT_FORMATS:
+            elapsed, size = run(output_format, steps)
+            print(f'{N}x{N} grid, {len(steps)} frames, {output_format:>5}: {elapsed * 1e3:7.1f} ms, {size / 1e3:8.1f} kB')
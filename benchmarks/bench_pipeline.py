@@ -0,0 +1,149 @@
+"""
+Runs the full pipeline on synthetic screenshots of growing grid size and reports per stage
+the runtime (best of a few repeats) and the peak memory allocated in that stage, as traced
+by tracemalloc in a separate pass, so that the tracing does not distort the timings.
+The results can be stored as baseline and later runs are compared against it, flagging
+stages which got slower or hungrier than the tolerance allows.
+
+Run from the root directory with `python -m benchmarks.bench_pipeline`, see --help for the options.
+Store a new baseline with `--save-baseline` after intended changes, and add `--check` to let
+the run fail on a regression. Timings depend on the machine, so compare baselines from the same one.
+"""
+import argparse
+import io
+import json
+import logging
+import os
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Tuple
+from benchmarks.puzzle_generator import generate_puzzle
+from src.image_manipulation import Image
+from src.solution_base import Solution
+from src.solver_naive import naive_method
+from src.state_visualisation import write_solution_gif
+
+BASELINE_FILE = os.path.join(os.path.dirname(__file__), 'baseline_pipeline.json')
+STAGES = ('pixels', 'tiling', 'fixed_tiles', 'tile_colours', 'final_ordering', 'solve', 'gif')
+
+
+def pipeline_stages(file_name: str) -> Tuple[List[Tuple[str, Callable]], Dict]:
+    # The stages of main.solve_file, split up such that each one can be measured on its own.
+    # They have to be called in order, as each one works on the results of the previous ones.
+    context = {}
+
+    def final_ordering():
+        context['solution'] = Solution(context['image'])
+
+    def gif():
+        write_solution_gif(context['solution'].steps, io.BytesIO(), duration=len(context['solution'].steps))
+
+    context['image'] = Image(file_name)
+    return [
+        ('pixels', lambda: context['image'].pixels),
+        ('tiling', lambda: context['image'].tiling),
+        ('fixed_tiles', lambda: context['image'].fixed_tiles),
+        ('tile_colours', lambda: context['image'].tile_colours),
+        ('final_ordering', final_ordering),
+        ('solve', lambda: context['solution'].solve(naive_method)),
+        ('gif', gif),
+    ], context
+
+def measure(file_name: str, repeats: int = 3) -> Tuple[Dict[str, Dict[str, float]], Solution]:
+    results = {stage: {'time': float('inf'), 'peak_memory': 0.0} for stage in STAGES}
+
+    for _ in range(repeats):
+        stages, _ = pipeline_stages(file_name)
+        for stage, run in stages:
+            start = time.perf_counter()
+            run()
+            results[stage]['time'] = min(results[stage]['time'], time.perf_counter() - start)
+
+    tracemalloc.start()
+    stages, context = pipeline_stages(file_name)
+    for stage, run in stages:
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+        results[stage]['peak_memory'] = float(peak - before)
+    tracemalloc.stop()
+
+    return results, context['solution']
+
+def run(sizes: List[Tuple[int, int]], repeats: int = 3, jpeg_quality: int = 90) -> Dict[str, Dict]:
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for N_i, N_j in sizes:
+            puzzle = generate_puzzle(N_i, N_j)
+            file_name = os.path.join(tmp_dir, f'puzzle_{N_i}x{N_j}.jpeg')
+            puzzle.image.save(file_name, quality=jpeg_quality)
+
+            stage_results, solution = measure(file_name, repeats=repeats)
+            correct = (solution.final_ordering == puzzle.final_ordering).all(axis=2).mean()
+            print(f'{N_i}x{N_j} grid, {len(solution.steps)} steps, {100 * correct:.1f} % of the final ordering correct.')
+            results[f'{N_i}x{N_j}'] = stage_results
+
+    return results
+
+def compare(results: Dict, baseline: Dict, time_tolerance: float, memory_tolerance: float) -> List[str]:
+    """
+    Prints the results next to the baseline and returns the list of regressions,
+    i.e. stages where time or memory exceed the baseline by more than the tolerance factor.
+    """
+    regressions = []
+    for grid, stage_results in results.items():
+        print(f'{grid} grid:')
+        for stage, result in stage_results.items():
+            line = f'  {stage:>14}: {result["time"] * 1e3:9.1f} ms, {result["peak_memory"] / 1e6:8.2f} MB'
+            reference = baseline.get(grid, {}).get(stage)
+            if reference is not None:
+                time_ratio = result['time'] / max(reference['time'], 1e-9)
+                memory_ratio = (result['peak_memory'] + 1e4) / (reference['peak_memory'] + 1e4)
+                line += f'  (baseline x{time_ratio:.2f} time, x{memory_ratio:.2f} memory)'
+                if time_ratio > time_tolerance or memory_ratio > memory_tolerance:
+                    regressions.append(f'{grid} {stage}')
+                    line += '  REGRESSION'
+            print(line)
+
+    return regressions
+
+def parse_args(args: List[str] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Benchmark the full pipeline on synthetic puzzles.')
+    parser.add_argument('--sizes', nargs='+', default=['8x10', '12x16', '20x25'], help='Grid sizes as NxM.')
+    parser.add_argument('--repeats', type=int, default=3, help='Timing repeats per grid size, the best one counts.')
+    parser.add_argument('--baseline', default=BASELINE_FILE, help='Baseline file to compare against.')
+    parser.add_argument('--save-baseline', action='store_true', help='Store the results as new baseline.')
+    parser.add_argument('--check', action='store_true', help='Exit with an error if any stage regressed.')
+    parser.add_argument('--time-tolerance', type=float, default=1.5, help='Allowed factor on the baseline time.')
+    parser.add_argument('--memory-tolerance', type=float, default=1.2, help='Allowed factor on the baseline memory.')
+    return parser.parse_args(args)
+
+def main(args: List[str] = None) -> int:
+    args = parse_args(args)
+    logging.disable(logging.INFO)
+    sizes = [tuple(int(n) for n in size.split('x')) for size in args.sizes]
+
+    results = run(sizes, repeats=args.repeats)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    regressions = compare(results, baseline, args.time_tolerance, args.memory_tolerance)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump({**baseline, **results}, f, indent=2, sort_keys=True)
+        print(f'Stored baseline in {args.baseline}.')
+
+    if regressions:
+        print(f'Regressions: {", ".join(regressions)}')
+
+    return 1 if args.check and regressions else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,51 @@
+"""
+Benchmark of the naive solver on synthetic, randomly scrambled grids.
+Compares the swap derivation with the inverse position index against the former approach,
+which searched the whole ordering matrix with np.argwhere for every swap.
+
+Run from the root directory with `python -m benchmarks.bench_solver_naive`.
+"""
+import time
+import numpy as np
+from src.solution_base import create_initial_ordering
+from src.solver_naive import naive_swaps
+
+
+def argwhere_swaps(final_ordering: np.ndarray) -> np.ndarray:
+    # The former way of finding the source of each swap, kept here as reference:
+    ordering = create_initial_ordering(final_ordering)
+    swaps = []
+    for i in range(ordering.shape[0]):
+        for j in range(ordering.shape[1]):
+            if (final_ordering[i, j, :] != ordering[i, j, :]).any():
+                k, l = final_ordering[i, j, :].tolist()
+                i_in, j_in = tuple(
+                    np.argwhere((ordering[:, :, 0] == k) * (ordering[:, :, 1] == l)).flatten().tolist()
+                )
+                tmp = ordering[i, j, :].copy()
+                ordering[i, j, :] = ordering[i_in, j_in, :]
+                ordering[i_in, j_in, :] = tmp
+                swaps.append((i, j, i_in, j_in))
+    return np.asarray(swaps, dtype=int).reshape((-1, 4))
+
+def random_final_ordering(N_i: int, N_j: int, seed: int = 0) -> np.ndarray:
+    permutation = np.random.default_rng(seed).permutation(N_i * N_j)
+    return np.stack([permutation // N_j, permutation % N_j], axis=-1).reshape((N_i, N_j, 2))
+
+def time_it(f, *args) -> float:
+    start = time.perf_counter()
+    result = f(*args)
+    return time.perf_counter() - start, result
+
+
+if __name__ == '__main__':
+    for N in (50, 200):
+        final_ordering = random_final_ordering(N, N)
+        t_new, swaps_new = time_it(naive_swaps, final_ordering)
+        t_old, swaps_old = time_it(argwhere_swaps, final_ordering)
+
+        assert (swaps_new == swaps_old).all()
+        print(
+            f'{N}x{N} grid, {len(swaps_new)} swaps: '
+            f'inverse index {t_new * 1e3:.1f} ms, argwhere {t_old * 1e3:.1f} ms, speedup {t_old / t_new:.0f}x'
+        )
@@ -0,0 +1,25 @@
+"""
+Compares the naive and the cycle-decomposition solver on synthetic, randomly scrambled grids
+in terms of runtime and achieved amount of steps.
+
+Run from the root directory with `python -m benchmarks.bench_solvers`.
+"""
+import time
+from benchmarks.bench_solver_naive import random_final_ordering
+from src.solver_cycles import cycle_swaps, minimum_swap_count
+from src.solver_naive import naive_swaps
+
+
+if __name__ == '__main__':
+    for N in (10, 50, 200, 500):
+        final_ordering = random_final_ordering(N, N)
+        results = {}
+        for name, solver in (('naive', naive_swaps), ('cycles', cycle_swaps)):
+            start = time.perf_counter()
+            swaps = solver(final_ordering)
+            results[name] = (time.perf_counter() - start, len(swaps))
+
+        print(
+            f'{N}x{N} grid, minimum {minimum_swap_count(final_ordering)} steps: '
+            + ', '.join(f'{name} {n} steps in {t * 1e3:.1f} ms' for name, (t, n) in results.items())
+        )
@@ -0,0 +1,96 @@
+"""
+Generates synthetic screenshots of puzzles, such that the full pipeline can be run on
+grids of any size and not only on the two images in the images-folder.
+A screenshot looks like the ones from the phone: A black status bar on top, then the board
+of adjacent tiles in a colour gradient, with a dark dot in the center of the fixed tiles,
+and bands of the app's background colour above and below the board.
+"""
+from types import SimpleNamespace
+import io
+import numpy as np
+from PIL import Image as PILImage
+from PIL import ImageDraw as PILImageDraw
+from benchmarks.bench_final_ordering import synthetic_puzzle
+from src.image_manipulation import _tile_boundaries
+
+# Colours of the app as in the screenshots in the images-folder:
+STATUS_BAR_COLOUR = (0, 0, 0)
+BACKGROUND_COLOUR = (32, 25, 33)
+
+
+def generate_puzzle(
+    N_i: int,
+    N_j: int,
+    seed: int = 0,
+    fixed: str = 'border',
+    tile_width: int = 90,
+    tile_height: int = 112,
+    noise: int = 0,
+    jpeg_quality: int = None,
+    bands: bool = True,
+    min_colour_distance: int = 4,
+) -> SimpleNamespace:
+    """
+    Creates a synthetic screenshot of an N_i x N_j puzzle with the gradient, fixed tiles and scramble
+    of synthetic_puzzle. The tile colours are drawn from a bright range, as the dots and the background
+    have to stand out, and redrawn until any two tiles differ by at least min_colour_distance in some
+    channel, as Solution refuses duplicate colours and JPEG-artefacts shift the colours a little.
+
+    :param fixed: Which tiles are fixed, 'border' or 'corners'.
+    :param noise: Uniform noise of +/- noise on the tile colours.
+    :param jpeg_quality: If given, the screenshot is passed through a JPEG-encoding of this quality,
+        which adds the compression artefacts of the real screenshots.
+    :param bands: Whether to add the status bar and the background bands. Image needs these
+        to cut the screenshot to size, so only switch them off when working on the board alone.
+
+    Returns an object with the screenshot in image and what the pipeline should find for it
+    in tiling, fixed_tiles (in the order of Image.fixed_tiles), tile_colours and final_ordering.
+    """
+    for attempt in range(100):
+        puzzle = synthetic_puzzle(N_i, N_j, seed=seed + 7919 * attempt, fixed=fixed, colour_range=(80, 256))
+        colours = puzzle.true_tile_colours.reshape((-1, 1, 3))
+        distances = np.abs(colours - colours.swapaxes(0, 1)).max(axis=2)
+        np.fill_diagonal(distances, min_colour_distance)
+        if distances.min() >= min_colour_distance:
+            break
+    else:
+        raise ValueError(f'Could not find a gradient with distinct colours for a {N_i}x{N_j} grid.')
+
+    tile_colours = puzzle.true_tile_colours
+    if noise > 0:
+        rng = np.random.default_rng(seed)
+        tile_colours = np.clip(tile_colours + rng.integers(-noise, noise + 1, tile_colours.shape), 0, 255)
+
+    width, height = N_i * tile_width, N_j * tile_height
+    x_bounds, y_bounds = _tile_boundaries(width, N_i), _tile_boundaries(height, N_j)
+
+    # Expand the tile colours to pixels, in numpy-orientation (y, x):
+    board = tile_colours.astype(np.uint8).swapaxes(0, 1)
+    board = np.repeat(np.repeat(board, np.diff(y_bounds), axis=0), np.diff(x_bounds), axis=1)
+
+    image = PILImage.fromarray(board)
+    draw = PILImageDraw.Draw(image)
+    radius = max(2, round(0.07 * min(tile_width, tile_height)))
+    for i, j in puzzle.fixed_tiles:
+        x, y = (x_bounds[i] + x_bounds[i + 1]) // 2, (y_bounds[j] + y_bounds[j + 1]) // 2
+        draw.ellipse((x - radius, y - radius, x + radius, y + radius), fill=BACKGROUND_COLOUR)
+
+    if bands:
+        status_bar, margin = round(0.05 * width), round(0.3 * height)
+        screenshot = PILImage.new('RGB', (width, status_bar + 2 * margin + height), BACKGROUND_COLOUR)
+        screenshot.paste(STATUS_BAR_COLOUR, (0, 0, width, status_bar))
+        screenshot.paste(image, (0, status_bar + margin))
+        image = screenshot
+
+    if jpeg_quality is not None:
+        fp = io.BytesIO()
+        image.save(fp, format='JPEG', quality=jpeg_quality)
+        image = PILImage.open(io.BytesIO(fp.getvalue())).convert('RGB')
+
+    return SimpleNamespace(
+        image=image,
+        tiling=[N_i, N_j],
+        fixed_tiles=sorted(puzzle.fixed_tiles, key=lambda t: (t[1], t[0])),
+        tile_colours=tile_colours,
+        final_ordering=puzzle.final_ordering,
+    )
@@ -1,7 +1,18 @@
+import argparse
+import glob
 import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import List, Tuple
+from src import instrumentation
+from src.async_pipeline import run_pipeline
 from src.image_manipulation import Image
 from src.solution_base import Solution
-from src.solver_naive import naive_method
+from src.final_ordering import ORDERING_METHODS
+from src.result_cache import ResultCache
+from src.solvers import SOLVERS
+from src.state_visualisation import OUTPUT_FORMATS
 
 # Set up logging:
 console_handler = logging.StreamHandler()
@@ -16,15 +27,180 @@ logging.basicConfig(
     format='%(levelname)s: %(message)s'
 )
 
-# ------------------------------- Choose filename here! --------------------------
-# File has to be in images directory and please only type the pure file-name here,
-# without the images-folder.
-file_name = 'test1.jpeg'
 
-# Do stuff.
-image = Image(file_name=f'images/{file_name}')
-solution = Solution(image)
-solution.solve(naive_method)
-solution.generate_gif()
+def collect_files(targets: List[str], latest: bool = False) -> List[str]:
+    """
+    Expands the given targets into a sorted list of image files. A target can either be
+    a directory, in which case all jpegs in there are taken, or a file name / glob pattern.
+    If latest is set, only the most recently modified file is returned.
+    """
+    files = set()
+    for target in targets:
+        if os.path.isdir(target):
+            for extension in ('jpeg', 'jpg', 'JPEG', 'JPG'):
+                files.update(glob.glob(os.path.join(target, f'*.{extension}')))
+        else:
+            files.update(f for f in glob.glob(target) if os.path.isfile(f))
 
-logger.info(f'Successfully solved the image and created the output gif in the solutions-folder.')
+    files = sorted(files)
+
+    if latest and files:
+        files = [max(files, key=os.path.getmtime)]
+
+    return files
+
+def solve_file(
+    file_name: str,
+    cache_dir: str = None,
+    cache_size: int = 1000,
+    solver: str = 'naive',
+    ordering_method: str = 'greedy',
+    output_format: str = 'gif',
+    metrics: bool = False,
+    trace_memory: bool = False,
+    draft: bool = False,
+) -> Tuple[str, bool, str, float]:
+    """
+    Runs the full pipeline for one file and creates the output in the given format in the solutions-folder.
+    Never raises, as we do not want one broken screenshot to take down a whole batch.
+    Instead, returns a tuple of (file_name, success, message, elapsed seconds).
+    If a cache directory is given, previously solved screenshots are taken from there.
+    With metrics, the timings of all stages are logged as one JSON line, see src.instrumentation,
+    with trace_memory also their peak memory.
+    With draft, JPEGs are decoded at reduced resolution, see Image.load_draft_pixels.
+    """
+    if metrics:
+        instrumentation.enable(trace_memory=trace_memory)
+
+    start = time.perf_counter()
+    try:
+        image = Image(file_name=file_name, draft=draft)
+        cache = ResultCache(cache_dir, max_entries=cache_size) if cache_dir is not None else None
+        solution = Solution(image, cache=cache, ordering_method=ordering_method)
+        solution.solve(SOLVERS[solver])
+        solution.generate_gif(output_format=output_format)
+    except Exception as e:
+        return file_name, False, f'{type(e).__name__}: {e}', time.perf_counter() - start
+
+    if metrics:
+        logger.info(f'Metrics: {instrumentation.format_metrics(solution.stage_metrics, file_name=file_name)}')
+
+    return file_name, True, str(solution), time.perf_counter() - start
+
+def run_batch(
+    files: List[str],
+    workers: int = None,
+    cache_dir: str = None,
+    cache_size: int = 1000,
+    solver: str = 'naive',
+    ordering_method: str = 'greedy',
+    output_format: str = 'gif',
+    metrics: bool = False,
+    trace_memory: bool = False,
+    draft: bool = False,
+) -> List[Tuple[str, bool, str, float]]:
+    """
+    Solves all given files in a process pool with the given amount of workers
+    (defaults to the amount of CPUs) and logs per-file results as well as the throughput.
+    """
+    os.makedirs('solutions', exist_ok=True)
+    results = []
+    start = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(
+                solve_file, file_name, cache_dir, cache_size, solver, ordering_method, output_format, metrics, trace_memory, draft,
+            ): file_name
+            for file_name in files
+        }
+        for future in as_completed(futures):
+            # solve_file reports its own errors, this only fails if the worker itself died, e.g. killed
+            # for running out of memory. That breaks the pool, so all files still pending fail as well.
+            try:
+                file_name, success, message, elapsed = future.result()
+            except Exception as e:
+                file_name, success, message, elapsed = futures[future], False, f'{type(e).__name__}: {e}', time.perf_counter() - start
+            results.append((file_name, success, message, elapsed))
+            if success:
+                logger.info(f'OK     {file_name} ({elapsed:.2f} s): {message}')
+            else:
+                logger.error(f'FAILED {file_name} ({elapsed:.2f} s): {message}')
+
+    total_time = time.perf_counter() - start
+    n_success = sum(1 for r in results if r[1])
+    logger.info(
+        f'Solved {n_success} / {len(results)} images in {total_time:.2f} s '
+        f'({len(results) / total_time if total_time > 0 else 0.0:.2f} images/s).'
+    )
+
+    return results
+
+def parse_args(args: List[str] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Solve "I love Hue" screenshots.')
+    parser.add_argument(
+        'targets', nargs='*', default=['images'],
+        help='Directories, files or glob patterns of screenshots to solve. Defaults to the images-folder.',
+    )
+    parser.add_argument('--latest', action='store_true', help='Only solve the most recently modified image.')
+    parser.add_argument('--workers', type=int, default=None, help='Amount of worker processes. Defaults to CPU count.')
+    parser.add_argument('--solver', choices=sorted(SOLVERS), default='naive', help='Solver method to use.')
+    parser.add_argument(
+        '--ordering', choices=sorted(ORDERING_METHODS), default='greedy',
+        help='Method to find the final ordering of the tiles.',
+    )
+    parser.add_argument(
+        '--format', choices=sorted(OUTPUT_FORMATS), default='gif',
+        help='Output format of the solution. json and swaps are move lists for clients which render the steps themselves.',
+    )
+    parser.add_argument('--cache-dir', default=None, help='Directory for the result cache. No caching if not given.')
+    parser.add_argument('--cache-size', type=int, default=1000, help='Maximum amount of entries in the result cache.')
+    parser.add_argument(
+        '--async-pipeline', action='store_true',
+        help='Overlap decoding, solving and writing of the images in an asyncio pipeline. Ignores the cache and --metrics.',
+    )
+    parser.add_argument(
+        '--draft', action='store_true',
+        help='Decode JPEGs at reduced resolution, as far as the tiles stay large enough for the analysis.',
+    )
+    parser.add_argument('--metrics', action='store_true', help='Log the time spent in each stage per image.')
+    parser.add_argument('--trace-memory', action='store_true', help='With --metrics, also trace the peak memory per stage.')
+    return parser.parse_args(args)
+
+def main(args: List[str] = None) -> int:
+    args = parse_args(args)
+    files = collect_files(args.targets, latest=args.latest)
+
+    if not files:
+        logger.error(f'No images found for {args.targets}.')
+        return 1
+
+    if args.async_pipeline:
+        results = run_pipeline(
+            files,
+            solver=SOLVERS[args.solver],
+            ordering_method=args.ordering,
+            output_format=args.format,
+            solve_workers=args.workers,
+            draft=args.draft,
+        )
+        return 0 if all(r[1] for r in results) else 1
+
+    results = run_batch(
+        files,
+        workers=args.workers,
+        cache_dir=args.cache_dir,
+        cache_size=args.cache_size,
+        solver=args.solver,
+        ordering_method=args.ordering,
+        output_format=args.format,
+        metrics=args.metrics,
+        trace_memory=args.trace_memory,
+        draft=args.draft,
+    )
+
+    return 0 if all(r[1] for r in results) else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,320 @@
+"""
+Long-running service mode: Instead of paying for the start-up and the imports on every call of main,
+a local HTTP server accepts screenshots as request body, queues them for a pool of warm worker
+processes and returns the solution in any of the output formats.
+
+Run `python3 -m server --port 8000` from the root directory and post a screenshot, e.g. with
+`curl --data-binary @images/test1.jpeg 'localhost:8000/solve?format=json'`.
+GET /health answers whether the server is up, GET /metrics returns the latency statistics.
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Tuple
+from urllib.parse import parse_qs, urlparse
+import numpy as np
+from PIL import Image as PILImage
+from src.final_ordering import ORDERING_METHODS
+from src.image_manipulation import Image
+from src.result_cache import ResultCache
+from src.solution_base import Solution
+from src.solvers import SOLVERS
+from src.state_visualisation import OUTPUT_FORMATS
+
+# Set up logging:
+console_handler = logging.StreamHandler()
+console_handler.setFormatter(logging.Formatter('%(name)s - %(levelname)s: %(message)s'))
+logger = logging.getLogger('server')
+logger.setLevel('INFO')
+logger.addHandler(console_handler)
+logger.propagate = False
+
+# Content types of the output formats in the responses:
+CONTENT_TYPES = {
+    'gif': 'image/gif',
+    'webp': 'image/webp',
+    'apng': 'image/apng',
+    'json': 'application/json',
+    'swaps': 'application/octet-stream',
+}
+
+# Amount of requests over which the latency percentiles in /metrics are calculated:
+LATENCY_WINDOW = 1000
+
+
+def _warm_up() -> bool:
+    # Initialiser of the worker processes: All imports are done by loading this module,
+    # we additionally register PIL's plugins and let numpy set up its FFT, such that
+    # the first request does not pay for it.
+    PILImage.init()
+    np.fft.rfft(np.zeros(64))
+    for name in ('image_manipulation', 'puzzle_solver', 'solution_base', 'solver_naive', 'solver_cycles'):
+        logging.getLogger(name).setLevel('WARNING')
+    return True
+
+def solve_bytes(
+    data: bytes,
+    solver: str = 'naive',
+    ordering_method: str = 'greedy',
+    output_format: str = 'json',
+    cache_dir: str = None,
+    cache_size: int = 1000,
+) -> Tuple[bytes, Dict]:
+    """
+    Runs the full pipeline on the bytes of a screenshot and returns the solution in the given format,
+    together with some information on the run: the amount of steps and the time in seconds
+    at which the worker started, and how long it took.
+    """
+    start = time.time()
+    image = Image.from_bytes(data, name='upload')
+    cache = ResultCache(cache_dir, max_entries=cache_size) if cache_dir is not None else None
+    solution = Solution(image, cache=cache, ordering_method=ordering_method)
+    solution.solve(SOLVERS[solver])
+
+    return solution.to_bytes(output_format), {'steps': len(solution.steps), 'started': start, 'solve_time': time.time() - start}
+
+
+class LatencyStats(object):
+    """
+    Thread-safe counters of the requests and the latencies of the last LATENCY_WINDOW solved ones.
+    """
+    def __init__(self, window: int = LATENCY_WINDOW) -> None:
+        super().__init__()
+        self.lock = threading.Lock()
+        self.counts = {'solved': 0, 'failed': 0, 'rejected': 0}
+        self.latencies = {'queue_time': deque(maxlen=window), 'solve_time': deque(maxlen=window), 'total_time': deque(maxlen=window)}
+
+    def count(self, outcome: str) -> None:
+        with self.lock:
+            self.counts[outcome] += 1
+
+    def record(self, **latencies: float) -> None:
+        with self.lock:
+            self.counts['solved'] += 1
+            for name, value in latencies.items():
+                self.latencies[name].append(value)
+
+    def summary(self) -> Dict:
+        with self.lock:
+            summary = dict(self.counts)
+            for name, values in self.latencies.items():
+                if values:
+                    p50, p90, p99 = np.percentile(np.asarray(values), [50, 90, 99]).tolist()
+                    summary[name] = {'p50': p50, 'p90': p90, 'p99': p99, 'max': max(values)}
+            return summary
+
+
+class SolveServer(ThreadingHTTPServer):
+    """
+    HTTP server which hands the screenshots posted to /solve to a pool of worker processes.
+    At most workers requests are solved at once and at most queue_size further ones wait for a worker,
+    any request beyond that is rejected right away with 503, such that a burst can not pile up
+    an unbounded backlog.
+    """
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address: Tuple[str, int],
+        workers: int = 2,
+        queue_size: int = 8,
+        solver: str = 'naive',
+        ordering_method: str = 'greedy',
+        output_format: str = 'json',
+        cache_dir: str = None,
+        cache_size: int = 1000,
+        max_body_size: int = 32 * 2 ** 20,
+    ) -> None:
+        super().__init__(address, SolveRequestHandler)
+        self.defaults = {'solver': solver, 'ordering': ordering_method, 'format': output_format}
+        self.cache_dir = cache_dir
+        self.cache_size = cache_size
+        self.max_body_size = max_body_size
+        self.slots = threading.BoundedSemaphore(workers + queue_size)
+        self.stats = LatencyStats()
+        self.workers = workers
+        self.executor_lock = threading.Lock()
+        self.executor = self._start_workers()
+
+    def _start_workers(self) -> ProcessPoolExecutor:
+        # Start all workers right away, so that none of the requests has to wait for a process to come up.
+        # They are started from a forkserver, as forking the server while one of its threads holds a lock
+        # would leave the worker deadlocked on it:
+        start_method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+        executor = ProcessPoolExecutor(
+            max_workers=self.workers, mp_context=multiprocessing.get_context(start_method), initializer=_warm_up,
+        )
+        for future in [executor.submit(_warm_up) for _ in range(self.workers)]:
+            future.result()
+        return executor
+
+    def _restart_workers(self, broken: ProcessPoolExecutor) -> None:
+        # A worker died, e.g. killed for running out of memory, which breaks the whole pool for good.
+        # The first request to notice replaces the pool, all others which failed on the same pool skip it:
+        with self.executor_lock:
+            if self.executor is not broken:
+                return
+            logger.error('A worker process died, restarting the workers.')
+            broken.shutdown(wait=False, cancel_futures=True)
+            self.executor = self._start_workers()
+
+    def server_close(self) -> None:
+        super().server_close()
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+    def solve(self, data: bytes, options: Dict[str, str]) -> Tuple[bytes, Dict]:
+        """
+        Solves one screenshot in the pool, blocking until it is done.
+        Raises OverflowError if all workers are busy and the queue is full, and BrokenProcessPool
+        if a worker died while the request was queued or solved, after the workers have been restarted.
+        """
+        if not self.slots.acquire(blocking=False):
+            self.stats.count('rejected')
+            raise OverflowError('All workers are busy and the queue is full.')
+
+        try:
+            received = time.time()
+            executor = self.executor
+            try:
+                payload, info = executor.submit(
+                    solve_bytes, data, options['solver'], options['ordering'], options['format'], self.cache_dir, self.cache_size,
+                ).result()
+            except BrokenProcessPool:
+                self.stats.count('failed')
+                self._restart_workers(executor)
+                raise
+            except Exception:
+                self.stats.count('failed')
+                raise
+        finally:
+            self.slots.release()
+
+        info['queue_time'] = max(0.0, info.pop('started') - received)
+        info['total_time'] = time.time() - received
+        self.stats.record(queue_time=info['queue_time'], solve_time=info['solve_time'], total_time=info['total_time'])
+
+        return payload, info
+
+
+class SolveRequestHandler(BaseHTTPRequestHandler):
+
+    server: SolveServer
+
+    def do_GET(self) -> None:
+        path = urlparse(self.path).path
+        if path == '/health':
+            self._respond(200, b'{"status":"ok"}', 'application/json')
+        elif path == '/metrics':
+            self._respond(200, json.dumps(self.server.stats.summary()).encode(), 'application/json')
+        else:
+            self._respond_error(404, f'Unknown path {path}.')
+
+    def do_POST(self) -> None:
+        url = urlparse(self.path)
+        if url.path != '/solve':
+            self._respond_error(404, f'Unknown path {url.path}.')
+            return
+
+        query = parse_qs(url.query)
+        options = {name: query.get(name, [default])[-1] for name, default in self.server.defaults.items()}
+        for name, choices in (('solver', SOLVERS), ('ordering', ORDERING_METHODS), ('format', OUTPUT_FORMATS)):
+            if options[name] not in choices:
+                self._respond_error(400, f'Unknown {name} {options[name]}, choose from {sorted(choices)}.')
+                return
+
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+        except ValueError:
+            self._respond_error(400, f'Invalid Content-Length {self.headers["Content-Length"]}.')
+            return
+        if length <= 0:
+            self._respond_error(400, 'Post the screenshot as request body.')
+            return
+        if length > self.server.max_body_size:
+            self._respond_error(413, f'Screenshot larger than {self.server.max_body_size} bytes.')
+            return
+        data = self.rfile.read(length)
+
+        try:
+            payload, info = self.server.solve(data, options)
+        except OverflowError as e:
+            self._respond_error(503, str(e), headers={'Retry-After': '1'})
+            return
+        except BrokenProcessPool:
+            self._respond_error(503, 'A worker process died, the workers have been restarted.', headers={'Retry-After': '1'})
+            return
+        except Exception as e:
+            self._respond_error(422, f'{type(e).__name__}: {e}')
+            return
+
+        logger.info(json.dumps({'path': url.path, 'bytes': length, **options, **info}))
+        self._respond(200, payload, CONTENT_TYPES[options['format']], headers={
+            'X-Steps': str(info['steps']),
+            'X-Queue-Time': f'{info["queue_time"]:.4f}',
+            'X-Solve-Time': f'{info["solve_time"]:.4f}',
+        })
+
+    def _respond(self, status: int, body: bytes, content_type: str, headers: Dict[str, str] = None) -> None:
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _respond_error(self, status: int, message: str, headers: Dict[str, str] = None) -> None:
+        logger.warning(f'{status} for {self.command} {self.path}: {message}')
+        self._respond(status, json.dumps({'error': message}).encode(), 'application/json', headers=headers)
+
+    def log_message(self, format: str, *args) -> None:
+        # The requests are logged with their metrics above, we do not need the access log on top.
+        pass
+
+
+def parse_args(args: List[str] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Serve solutions of "I love Hue" screenshots over HTTP.')
+    parser.add_argument('--host', default='127.0.0.1', help='Address to listen on.')
+    parser.add_argument('--port', type=int, default=8000, help='Port to listen on.')
+    parser.add_argument('--workers', type=int, default=2, help='Amount of worker processes.')
+    parser.add_argument('--queue-size', type=int, default=8, help='Requests waiting for a worker before new ones get rejected.')
+    parser.add_argument('--solver', choices=sorted(SOLVERS), default='naive', help='Default solver method.')
+    parser.add_argument('--ordering', choices=sorted(ORDERING_METHODS), default='greedy', help='Default ordering method.')
+    parser.add_argument('--format', choices=sorted(OUTPUT_FORMATS), default='json', help='Default output format.')
+    parser.add_argument('--cache-dir', default=None, help='Directory for the result cache. No caching if not given.')
+    parser.add_argument('--cache-size', type=int, default=1000, help='Maximum amount of entries in the result cache.')
+    return parser.parse_args(args)
+
+def main(args: List[str] = None) -> int:
+    args = parse_args(args)
+    server = SolveServer(
+        (args.host, args.port),
+        workers=args.workers,
+        queue_size=args.queue_size,
+        solver=args.solver,
+        ordering_method=args.ordering,
+        output_format=args.format,
+        cache_dir=args.cache_dir,
+        cache_size=args.cache_size,
+    )
+    logger.info(f'Serving on {args.host}:{server.server_address[1]} with {args.workers} workers.')
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,159 @@
+"""
+Pipelined solving of a stream of screenshots with asyncio: Each file goes through three stages,
+decoding (loading and cutting the image), solving (image analysis, final ordering and solver) and
+writing the output. Decoding and writing are mostly done by Pillow, which releases the GIL for a good
+part of it, so they run in thread pools, while the numpy-heavy solving runs in a process pool.
+Bounded queues between the stages keep the decoded images from piling up in memory when the
+solvers can not keep up, and while one file is being solved, the next ones are decoded and the
+previous ones written, such that all cores are kept busy.
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, List, Tuple
+import numpy as np
+from .image_manipulation import Image
+from .solution_base import Solution, SwapLog
+from .solver_naive import naive_method
+from .state_visualisation import OUTPUT_FORMATS, write_solution
+
+# Set up logging:
+console_handler = logging.StreamHandler()
+console_handler.setFormatter(logging.Formatter('%(name)s - %(levelname)s: %(message)s'))
+logger = logging.getLogger('async_pipeline')
+logger.setLevel('INFO')
+logger.addHandler(console_handler)
+logger.propagate = False
+
+
+def _process_context() -> multiprocessing.context.BaseContext:
+    # The worker processes must not be forked: By the time a worker is started, the decoding and
+    # writing threads are running, and a child forked while one of them holds a lock, e.g. the one of
+    # a logging handler, deadlocks on it. A forkserver forks from a clean, single-threaded process.
+    return multiprocessing.get_context('forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn')
+
+def _decode(file_name: str, draft: bool = False) -> np.ndarray:
+    # Loads the image and cuts it to size, see Image.pixels, with draft at reduced resolution.
+    return Image(file_name, draft=draft).pixels
+
+def _solve(file_name: str, pixels: np.ndarray, solver: Callable, ordering_method: str) -> SwapLog:
+    # Runs in a worker process on the already decoded pixels and only sends the compact steps back.
+    image = Image.from_array(pixels, name=file_name, cut=False)
+    solution = Solution(image, ordering_method=ordering_method)
+    solution.solve(solver)
+    return solution.steps
+
+def _write(file_name: str, steps: SwapLog, output_format: str, output_dir: str) -> None:
+    # Writes the output in the same way as generate_solution_gif, but into output_dir.
+    extension, _ = OUTPUT_FORMATS[output_format]
+    with open(os.path.join(output_dir, f'{os.path.basename(file_name)}.{extension}'), 'wb') as fp:
+        write_solution(steps, fp, output_format=output_format)
+
+async def solve_files(
+    files: List[str],
+    solver: Callable = naive_method,
+    ordering_method: str = 'greedy',
+    output_format: str = 'gif',
+    output_dir: str = 'solutions',
+    decode_threads: int = 2,
+    solve_workers: int = None,
+    write_threads: int = 2,
+    queue_size: int = 4,
+    draft: bool = False,
+) -> List[Tuple[str, bool, str, float]]:
+    """
+    Solves all given files in the three-stage pipeline and writes the output in the given format into
+    output_dir. As in main.solve_file, a broken file does not stop the others, instead a tuple of
+    (file_name, success, message, elapsed seconds) is returned for every file, in the order of completion.
+    The solver has to be picklable, i.e. a module-level function like naive_method.
+
+    :param solve_workers: Amount of worker processes for solving, defaults to the amount of CPUs.
+    :param queue_size: Maximum amount of items waiting between two stages.
+    :param draft: Decode JPEGs at reduced resolution, see Image.load_draft_pixels.
+    """
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f'Unknown output format {output_format}, choose from {sorted(OUTPUT_FORMATS)}.')
+
+    loop = asyncio.get_running_loop()
+    solve_workers = solve_workers or os.cpu_count() or 1
+    decoded, solved = asyncio.Queue(maxsize=queue_size), asyncio.Queue(maxsize=queue_size)
+    results = []
+
+    def finish(file_name: str, start: float, error: Exception = None, steps: SwapLog = None) -> None:
+        elapsed = time.perf_counter() - start
+        if error is not None:
+            results.append((file_name, False, f'{type(error).__name__}: {error}', elapsed))
+            logger.error(f'FAILED {file_name} ({elapsed:.2f} s): {results[-1][2]}')
+        else:
+            results.append((file_name, True, f'Solution for image {file_name} in {len(steps)} steps.', elapsed))
+            logger.info(f'OK     {file_name} ({elapsed:.2f} s): {results[-1][2]}')
+
+    async def decode_stage(pending: asyncio.Queue, executor: ThreadPoolExecutor) -> None:
+        while not pending.empty():
+            file_name = pending.get_nowait()
+            start = time.perf_counter()
+            try:
+                pixels = await loop.run_in_executor(executor, _decode, file_name, draft)
+            except Exception as e:
+                finish(file_name, start, error=e)
+                continue
+            await decoded.put((file_name, start, pixels))
+
+    async def solve_stage(executor: ProcessPoolExecutor) -> None:
+        while (item := await decoded.get()) is not None:
+            file_name, start, pixels = item
+            try:
+                steps = await loop.run_in_executor(executor, _solve, file_name, pixels, solver, ordering_method)
+            except Exception as e:
+                finish(file_name, start, error=e)
+                continue
+            await solved.put((file_name, start, steps))
+
+    async def write_stage(executor: ThreadPoolExecutor) -> None:
+        while (item := await solved.get()) is not None:
+            file_name, start, steps = item
+            try:
+                await loop.run_in_executor(executor, _write, file_name, steps, output_format, output_dir)
+            except Exception as e:
+                finish(file_name, start, error=e)
+                continue
+            finish(file_name, start, steps=steps)
+
+    os.makedirs(output_dir, exist_ok=True)
+    pending = asyncio.Queue()
+    for file_name in files:
+        pending.put_nowait(file_name)
+
+    with ThreadPoolExecutor(decode_threads) as decode_executor, \
+            ProcessPoolExecutor(solve_workers, mp_context=_process_context()) as solve_executor, \
+            ThreadPoolExecutor(write_threads) as write_executor:
+        decoders = [asyncio.create_task(decode_stage(pending, decode_executor)) for _ in range(decode_threads)]
+        solvers = [asyncio.create_task(solve_stage(solve_executor)) for _ in range(solve_workers)]
+        writers = [asyncio.create_task(write_stage(write_executor)) for _ in range(write_threads)]
+
+        # Each stage is shut down by one None per task once the previous stage is done:
+        await asyncio.gather(*decoders)
+        for _ in solvers:
+            await decoded.put(None)
+        await asyncio.gather(*solvers)
+        for _ in writers:
+            await solved.put(None)
+        await asyncio.gather(*writers)
+
+    return results
+
+def run_pipeline(files: List[str], **kwargs) -> List[Tuple[str, bool, str, float]]:
+    """
+    Synchronous entry point to solve_files, for callers without an event loop.
+    """
+    start = time.perf_counter()
+    results = asyncio.run(solve_files(files, **kwargs))
+    total_time = time.perf_counter() - start
+    logger.info(
+        f'Solved {sum(1 for r in results if r[1])} / {len(results)} images in {total_time:.2f} s '
+        f'({len(results) / total_time if total_time > 0 else 0.0:.2f} images/s).'
+    )
+    return results
@@ -1,7 +1,10 @@
+import heapq
 import logging
 import numpy as np
-from typing import List, Tuple
-from .image_manipulation import Image
+from functools import partial
+from typing import List, Set, Tuple, Union
+from .image_manipulation import COLOUR_DTYPE, COORDINATE_DTYPE, Image
+from .instrumentation import instrumented
 
 # Set up logging:
 console_handler = logging.StreamHandler()
@@ -28,7 +31,11 @@ def _generate_fixed_tiles_mask(
 
     return mask
 
-def _find_reference_tiles(tile_x: int, tile_y: int, fixed_tiles: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+def _find_reference_tiles(
+    tile_x: int,
+    tile_y: int,
+    fixed_tiles: Union[List[Tuple[int, int]], Set[Tuple[int, int]]],
+) -> List[Tuple[int, int]]:
     """
     Helper function to determine the reference tiles for a given tile.
     A reference tile is a fixed tile which is bordering the tile in question in either
@@ -48,8 +55,16 @@ def _calculate_delta_to_reference_tiles(
     """
     Calculates the deltas between the target tile and the reference tile and returns
     a mean of the absolute deltas in the colour channels, for all tiles.
+    All reference tiles are handled in one go, uint8-colours in int16, which holds the summed
+    distances of up to four reference tiles. The tile colours are small, so unlike colour_distances
+    on the screenshot, the upcast is cheaper here than the overhead of one call per reference tile.
     """
-    return sum([np.abs(tile_colours - tile_colours[ref_tile[0], ref_tile[1], :]) for ref_tile in reference_tiles]).mean(axis=2) / len(reference_tiles)
+    colours = np.asarray(tile_colours)
+    if colours.dtype == COLOUR_DTYPE:
+        colours = colours.astype(np.int16)
+    reference_colours = colours[tuple(np.asarray(reference_tiles).T)]
+    deltas = np.abs(colours - reference_colours[:, np.newaxis, np.newaxis, :])
+    return deltas.sum(axis=(0, 3)) / (3 * len(reference_tiles))
     
 def _extract_target_tile_coordinates(
     deltas: np.ndarray, 
@@ -65,7 +80,116 @@ def _extract_target_tile_coordinates(
     location = np.unravel_index(np.argmin(tmp), tmp.shape)
     return location
 
-def find_final_ordering(image: Image) -> np.ndarray:
+class ColourIndex(object):
+    """
+    KD-tree over the colours of the still unassigned tiles, to find the tile with the lowest
+    summed L1-distance to a set of reference colours without looking at all tiles.
+    The search is exact: The summed distance from any colour in a node's bounding box to the
+    references is bounded from below by the summed distances from the box to each reference,
+    so we can skip all nodes whose lower bound is worse than the best tile found so far.
+    Ties are resolved towards the lowest flat index, exactly as np.argmin does it in 
+    _extract_target_tile_coordinates.
+
+    :param colours: Tile colours of shape (N_i, N_j, 3).
+    :param excluded_mask: Matrix of shape (N_i, N_j), tiles with a non-zero entry are not in the index.
+    :param leaf_size: Maximum amount of tiles per leaf, which are searched in one vectorised go.
+    """
+    def __init__(self, colours: np.ndarray, excluded_mask: np.ndarray = None, leaf_size: int = 16) -> None:
+        super().__init__()
+        self.shape = colours.shape[:2]
+        self.colours = np.asarray(colours).reshape((-1, 3))
+        if np.issubdtype(self.colours.dtype, np.integer):
+            self.colours = self.colours.astype(np.int32)
+        self.alive = np.ones(len(self.colours), dtype=bool)
+        if excluded_mask is not None:
+            self.alive[np.asarray(excluded_mask).flatten() != 0] = False
+
+        # Nodes are stored in flat lists: bounding box, children (or None for leaves),
+        # the tile indices for leaves, the parent and the amount of alive tiles below.
+        self.lower, self.upper, self.children, self.members, self.parent, self.count = [], [], [], [], [], []
+        self.leaf_of = np.zeros(len(self.colours), dtype=int)
+        self._build(np.flatnonzero(self.alive), -1, leaf_size)
+
+    def _build(self, members: np.ndarray, parent: int, leaf_size: int) -> int:
+        node = len(self.lower)
+        points = self.colours[members]
+        self.lower.append(tuple(points.min(axis=0).tolist()) if len(points) else (0, 0, 0))
+        self.upper.append(tuple(points.max(axis=0).tolist()) if len(points) else (0, 0, 0))
+        self.parent.append(parent)
+        self.count.append(len(members))
+        self.children.append(None)
+        self.members.append(None)
+
+        spread = np.asarray(self.upper[node]) - np.asarray(self.lower[node])
+        if len(members) <= leaf_size or spread.max() == 0:
+            self.members[node] = members
+            self.leaf_of[members] = node
+            return node
+
+        # Split at the median of the channel with the largest spread:
+        axis = int(np.argmax(spread))
+        order = np.argsort(points[:, axis], kind='stable')
+        half = len(members) // 2
+        left = self._build(members[order[:half]], node, leaf_size)
+        right = self._build(members[order[half:]], node, leaf_size)
+        self.children[node] = (left, right)
+        return node
+
+    def _lower_bound(self, node: int, references: List[Tuple]) -> float:
+        # This is called for a lot of small nodes, so plain Python is faster than numpy here:
+        (l0, l1, l2), (u0, u1, u2) = self.lower[node], self.upper[node]
+        bound = 0
+        for r0, r1, r2 in references:
+            bound += l0 - r0 if r0 < l0 else (r0 - u0 if r0 > u0 else 0)
+            bound += l1 - r1 if r1 < l1 else (r1 - u1 if r1 > u1 else 0)
+            bound += l2 - r2 if r2 < l2 else (r2 - u2 if r2 > u2 else 0)
+        return bound
+
+    def closest(self, reference_colours: List[np.ndarray]) -> Tuple[int, int]:
+        """
+        Returns the coordinates of the alive tile with the lowest summed L1-distance to the reference colours.
+        """
+        references = np.asarray(reference_colours, dtype=self.colours.dtype).reshape((-1, 3))
+        references_list = [tuple(r) for r in references.tolist()]
+        best = (np.inf, -1)
+        heap = [(self._lower_bound(0, references_list), 0)]
+
+        while heap:
+            bound, node = heapq.heappop(heap)
+            # Nodes with a bound equal to the best distance can still hold a tie with a lower index:
+            if bound > best[0]:
+                break
+
+            if self.children[node] is None:
+                members = self.members[node]
+                members = members[self.alive[members]]
+                distances = np.abs(self.colours[members][:, np.newaxis, :] - references).sum(axis=(1, 2))
+                d = distances.min()
+                candidate = (d.item(), int(members[distances == d].min()))
+                best = min(best, candidate)
+            else:
+                for child in self.children[node]:
+                    if self.count[child] > 0:
+                        heapq.heappush(heap, (self._lower_bound(child, references_list), child))
+
+        return np.unravel_index(best[1], self.shape)
+
+    def remove(self, tile_x: int, tile_y: int) -> None:
+        """
+        Removes a tile from the index, e.g. after it has been assigned.
+        """
+        idx = tile_x * self.shape[1] + tile_y
+        if not self.alive[idx]:
+            return
+
+        self.alive[idx] = False
+        node = self.leaf_of[idx]
+        while node != -1:
+            self.count[node] -= 1
+            node = self.parent[node]
+
+@instrumented('final_ordering')
+def find_final_ordering(image: Image, engine: str = 'bruteforce') -> np.ndarray:
     """
     Determines the final ordering of the tiles in an image by doing the following steps
     for each non-fixed tile:
@@ -80,6 +204,10 @@ def find_final_ordering(image: Image) -> np.ndarray:
     at the supposed final position. This can be used by the step-generator of the solver
     to determine the best swapping order. 
 
+    The search in b) to d) is either done on the complete colour matrix (engine = 'bruteforce')
+    or with a KD-tree over the still unassigned tiles (engine = 'kdtree'), which gives the
+    same results, but scales better with the amount of tiles.
+
     Known weaknesses / TODO: If the problem is not solvable from the top left to the bottom right,
     then the approach chosen here fails. E.g. if there are no fixed tiles in the cells
     (0, 0), (0, 1) or (1, 0).
@@ -88,16 +216,20 @@ def find_final_ordering(image: Image) -> np.ndarray:
     # two entries in the 3rd dimension which will contain the coordinates / colours. 
     # This will make assignments and read-outs easier, later.
     N_i, N_j = image.tiling
-    final_ordering = -np.ones((N_i, N_j, 2), dtype=int)
-    final_colouring = -np.ones((N_i, N_j, 3), dtype=int)
+    final_ordering = -np.ones((N_i, N_j, 2), dtype=COORDINATE_DTYPE)
+    final_colouring = np.zeros((N_i, N_j, 3), dtype=COLOUR_DTYPE)
+
+    if engine not in ('bruteforce', 'kdtree'):
+        raise ValueError(f'Unknown engine {engine} for finding the final ordering.')
 
     mask = _generate_fixed_tiles_mask(image.fixed_tiles, image.tiling)
+    index = ColourIndex(image.tile_colours, excluded_mask=mask) if engine == 'kdtree' else None
 
     # We will need to keep a ledger on all tiles already fixed or determined,
     # as tiles we already know about become "fixed tiles" in the sense of our
     # puzzle solver. This requires that we copy the fixed tiles to have it 
-    # manipulatable without side effects.
-    fixed_tiles_list = image.fixed_tiles[:]
+    # manipulatable without side effects. We use a set, as we look up tiles in there a lot.
+    fixed_tiles_set = set(image.fixed_tiles)
     
     # Create a lookup which translates from new to old coordinates such that the
     # new coordinates are the keys and the old coordinates are the values: D[new] = old
@@ -110,7 +242,7 @@ def find_final_ordering(image: Image) -> np.ndarray:
             # whether the tile is fixed or not. For fixed tiles, we just copy the tile,
             # for swappable tiles, we find the one with the closest difference to the
             # reference tiles:
-            if (i, j) in image.fixed_tiles:
+            if (i, j) in fixed_tiles_set:
                 # Assign the source position and colours to the target and note the fixed
                 # tiles in the list of already processed tiles:
                 final_ordering[i, j, 0] = i
@@ -118,22 +250,30 @@ def find_final_ordering(image: Image) -> np.ndarray:
                 final_colouring[i, j, :] = image.tile_colours[i, j, :]
                 new_to_old_lookup[(i, j)] = (i, j)
                 
-    # Now deal with the movable tiles:
+    # Now deal with the movable tiles. The debug messages are only formatted when they are shown:
+    debug = logger.isEnabledFor(logging.DEBUG)
     for i in range(N_i):
         for j in range(N_j):
-            if (i, j) not in fixed_tiles_list:
-                reference_tiles = _find_reference_tiles(i, j, fixed_tiles_list)
+            if (i, j) not in fixed_tiles_set:
+                reference_tiles = _find_reference_tiles(i, j, fixed_tiles_set)
                 
                 # What would the reference tiles' coordinates be in the original image?
                 reference_tiles_old_coordinates = [new_to_old_lookup[(i, j)] for (i, j) in reference_tiles]
                 
-                # Calculate the deltas of all the colours in the original image to the reference colours
-                # indexed by the old coordinate frame:
-                deltas = _calculate_delta_to_reference_tiles(reference_tiles_old_coordinates, image.tile_colours)
+                if index is None:
+                    # Calculate the deltas of all the colours in the original image to the reference colours
+                    # indexed by the old coordinate frame:
+                    deltas = _calculate_delta_to_reference_tiles(reference_tiles_old_coordinates, image.tile_colours)
+
+                    # Extract the tile with the lowest distance, assuming the fixed-point-mask given in the old
+                    # coordinates:
+                    k, l = _extract_target_tile_coordinates(deltas, mask)
+                else:
+                    if not reference_tiles_old_coordinates:
+                        raise ValueError(f'No reference tiles for position {(i, j)}.')
 
-                # Extract the tile with the lowest distance, assuming the fixed-point-mask given in the old
-                # coordinates:
-                k, l = _extract_target_tile_coordinates(deltas, mask)
+                    k, l = index.closest([image.tile_colours[ref] for ref in reference_tiles_old_coordinates])
+                    index.remove(k, l)
 
                 # Assign the source position and colours to the target:
                 final_ordering[i, j, 0] = k
@@ -143,16 +283,163 @@ def find_final_ordering(image: Image) -> np.ndarray:
                 # Register the newly swapped in colour in the mask:
                 new_to_old_lookup[(i, j)] = (k, l)
                 mask[k, l] = 1.0
-                fixed_tiles_list.append((i, j))
+                fixed_tiles_set.add((i, j))
 
-                logger.debug(f'Checked for position {(i, j)}: Target is originally at {(k, l)}.')
+                if debug:
+                    logger.debug('Checked for position %s: Target is originally at %s.', (i, j), (k, l))
 
-            else:
-                logger.debug(f'Checked for position {(i, j)}: Fixed tile, nothing to do.')
+            elif debug:
+                logger.debug('Checked for position %s: Fixed tile, nothing to do.', (i, j))
 
     logger.info('Created final ordering.')
 
     return final_ordering, final_colouring
 
+def _fit_bilinear_colour_field(
+    fixed_tiles: List[Tuple[int, int]],
+    tile_colours: np.ndarray,
+    tiling: List[int],
+) -> np.ndarray:
+    """
+    Fits a bilinear colour field, i.e. a bilinear interpolation between four corner colours,
+    to the colours of the fixed tiles in a least-squares sense and returns the predicted
+    colour for every position as matrix of shape (N_i, N_j, 3).
+    """
+    N_i, N_j = tiling
+
+    def basis(i, j):
+        u = np.asarray(i, dtype=float) / max(N_i - 1, 1)
+        v = np.asarray(j, dtype=float) / max(N_j - 1, 1)
+        return np.stack([(1 - u) * (1 - v), u * (1 - v), (1 - u) * v, u * v], axis=-1)
+
+    fixed = np.asarray(fixed_tiles, dtype=int).reshape((-1, 2))
+    corners, _, _, _ = np.linalg.lstsq(
+        basis(fixed[:, 0], fixed[:, 1]),
+        tile_colours[fixed[:, 0], fixed[:, 1], :].astype(float),
+        rcond=None,
+    )
+
+    i, j = np.meshgrid(np.arange(N_i), np.arange(N_j), indexing='ij')
+    return basis(i, j) @ corners
+
+def _linear_sum_assignment(cost: np.ndarray) -> np.ndarray:
+    """
+    Solves the linear assignment problem for a square cost matrix with the shortest augmenting
+    path algorithm (Jonker-Volgenant style, as described by Crouse, 2016): Rows are assigned one
+    after the other, each time along the shortest alternating path with respect to the reduced costs.
+    The inner loop over the columns is vectorised.
+    Returns the column assigned to each row, such that the summed cost is minimal.
+    """
+    n = cost.shape[0]
+    cost = cost.astype(float)
+    u = np.zeros(n)
+    col_for_row = -np.ones(n, dtype=int)
+    row_for_col = -np.ones(n, dtype=int)
+
+    # Initialisation by column reduction: With the column minima as duals, all reduced costs
+    # are non-negative, and we can already assign every column to its cheapest row, as long as
+    # that row is still free. Only the remaining rows need to be augmented.
+    v = cost.min(axis=0)
+    for j, i in enumerate(cost.argmin(axis=0).tolist()):
+        if col_for_row[i] == -1:
+            col_for_row[i] = j
+            row_for_col[j] = i
+
+    for current_row in np.flatnonzero(col_for_row == -1).tolist():
+        shortest = np.full(n, np.inf)
+        path = -np.ones(n, dtype=int)
+        visited_rows = np.zeros(n, dtype=bool)
+        visited_cols = np.zeros(n, dtype=bool)
+        min_value = 0.0
+        i = current_row
+        sink = -1
+
+        # Dijkstra-like search for the shortest path to an unassigned column:
+        while sink == -1:
+            visited_rows[i] = True
+            reduced = min_value + cost[i] - u[i] - v
+            improved = ~visited_cols & (reduced < shortest)
+            path[improved] = i
+            shortest[improved] = reduced[improved]
+
+            candidates_costs = np.where(visited_cols, np.inf, shortest)
+            min_value = candidates_costs.min()
+            candidates = np.flatnonzero(candidates_costs == min_value)
+            free = candidates[row_for_col[candidates] == -1]
+            j = free[0] if len(free) else candidates[0]
+
+            visited_cols[j] = True
+            if row_for_col[j] == -1:
+                sink = j
+            else:
+                i = row_for_col[j]
+
+        # Update the dual variables:
+        u[current_row] += min_value
+        others = np.flatnonzero(visited_rows)
+        others = others[others != current_row]
+        u[others] += min_value - shortest[col_for_row[others]]
+        v[visited_cols] -= min_value - shortest[visited_cols]
+
+        # Augment along the path:
+        j = sink
+        while True:
+            i = path[j]
+            row_for_col[j] = i
+            col_for_row[i], j = j, col_for_row[i]
+            if i == current_row:
+                break
+
+    return col_for_row
+
+@instrumented('final_ordering')
+def find_final_ordering_by_assignment(image: Image) -> np.ndarray:
+    """
+    Determines the final ordering of the tiles globally instead of greedily:
+    a) fitting a bilinear colour field to the colours of the fixed tiles, which
+       gives the expected colour for every movable position
+    b) building a cost matrix between all movable positions and all movable tiles,
+       with the mean absolute colour deviation as cost
+    c) solving the linear assignment problem on that matrix, such that the summed
+       deviation of all tiles from their expected colour is minimal
+
+    Contrary to find_final_ordering, this does not depend on the order in which positions
+    are processed and works wherever the fixed tiles are. The result has the same format.
+    """
+    N_i, N_j = image.tiling
+    fixed_tiles_set = set(image.fixed_tiles)
+    movable = np.asarray(
+        [(i, j) for i in range(N_i) for j in range(N_j) if (i, j) not in fixed_tiles_set],
+        dtype=COORDINATE_DTYPE,
+    ).reshape((-1, 2))
+
+    expected_colours = _fit_bilinear_colour_field(image.fixed_tiles, image.tile_colours, image.tiling)
+    expected_movable = expected_colours[movable[:, 0], movable[:, 1], :]
+    colours_movable = image.tile_colours[movable[:, 0], movable[:, 1], :]
+
+    # Rows are the target positions, columns the source tiles. We sum up channel by channel,
+    # to not have an intermediate of shape (n, n, 3):
+    cost = sum(
+        np.abs(expected_movable[:, np.newaxis, c] - colours_movable[np.newaxis, :, c]) for c in range(3)
+    ) / 3
+    assignment = _linear_sum_assignment(cost)
+    sources = movable[assignment]
+
+    # Fixed tiles stay where they are, all others come from their assigned source:
+    final_ordering = np.stack(np.meshgrid(np.arange(N_i), np.arange(N_j), indexing='ij'), axis=-1).astype(COORDINATE_DTYPE)
+    final_ordering[movable[:, 0], movable[:, 1], :] = sources
+    final_colouring = image.tile_colours[final_ordering[:, :, 0], final_ordering[:, :, 1], :]
+
+    logger.info(f'Created final ordering by assignment with a mean deviation of {cost[np.arange(len(cost)), assignment].mean():.2f}.')
+
+    return final_ordering, final_colouring
+
+# Methods to find the final ordering, by name, e.g. to choose from in Solution:
+ORDERING_METHODS = {
+    'greedy': partial(find_final_ordering, engine='bruteforce'),
+    'greedy_kdtree': partial(find_final_ordering, engine='kdtree'),
+    'assignment': find_final_ordering_by_assignment,
+}
+
 def determine_swapping_order(final_ordering: np.ndarray) -> List[Tuple[Tuple[int, int]]]:
     return None
\ No newline at end of file
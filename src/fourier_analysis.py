@@ -1,3 +1,4 @@
+import functools
 import numpy as np
 import typing
 
@@ -21,6 +22,43 @@ def get_major_frequencies_from_matrix(m: np.ndarray) -> typing.Tuple[float]:
         _get_major_frequency_from_array(m[5, :] ** 2),
     )
 
+def vote(frequencies: np.ndarray) -> float:
+    # Returns the frequency which shows up most often, e.g. among the scanlines of an image.
+    # On a tie, the lower frequency wins, as the usual error is picking up a harmonic, e.g.
+    # from the dots in the tiles.
+    values, counts = np.unique(np.round(frequencies), return_counts=True)
+    return values[np.argmax(counts)]
+
+def get_major_frequencies_batched(
+    signals: typing.List[np.ndarray],
+    ignore_constant: bool = True,
+) -> np.ndarray:
+    # Batched version of _get_major_frequency_from_array for many signals, e.g. the scanlines of
+    # many images: Signals are grouped by their length, and each group is transformed with one 
+    # call to rfft. Returns the main frequency of each signal, in the order they were given.
+    frequencies = np.zeros(len(signals), dtype=float)
+
+    groups = {}
+    for k, signal in enumerate(signals):
+        groups.setdefault(len(signal), []).append(k)
+
+    for length, indices in groups.items():
+        amplitudes = np.abs(np.fft.rfft(np.stack([signals[k] for k in indices]), axis=1))
+
+        # Only keep the same positive frequencies as _get_major_frequency_from_array does:
+        amplitudes = amplitudes[:, :length // 2]
+        if ignore_constant:
+            amplitudes[:, 0] = 0
+
+        frequencies[indices] = _positive_frequencies(length)[np.argmax(amplitudes, axis=1)]
+
+    return frequencies
+
+@functools.lru_cache(maxsize=64)
+def _positive_frequencies(length: int) -> np.ndarray:
+    # Many screenshots share their resolution, so we only compute this once per signal length.
+    return np.fft.fftfreq(length, d=1/length)[:length // 2]
+
 def _get_major_frequency_from_array(arr: np.ndarray, ignore_constant=True) -> float:
     # Do the FFT, standard control theory notation:
     A = np.fft.fft(arr)
@@ -1,10 +1,13 @@
+import io
 import logging
 import numpy as np
-from typing import List, Tuple
+from functools import cached_property
+from typing import BinaryIO, List, Tuple, Union
 from PIL import Image as PILImage
 from PIL import ImageFilter as PILImageFilter
 
-from .fourier_analysis import get_major_frequencies_from_matrix
+from .fourier_analysis import get_major_frequencies_from_matrix, get_major_frequencies_batched, vote
+from .instrumentation import instrumented, stage
 
 # Set up logging:
 console_handler = logging.StreamHandler()
@@ -14,55 +17,192 @@ logger.setLevel('INFO')
 logger.addHandler(console_handler)
 logger.propagate = False
 
+# Mean channel distance up to which a pixel counts as background colour and share of a row
+# which has to be of background colour to be cut away, see cut_array_to_size:
+CUT_COLOUR_DISTANCE_THRESHOLD = 40.0
+CUT_MAJORITY_VOTE_THRESHOLD = 0.95
+
+# Thresholds for the spot checks in the dot-detection, see Image.tile_has_dot:
+DOT_COLOUR_DISTANCE_THRESHOLD = 20.0
+DOT_MAJORITY_VOTE_THRESHOLD = 0.90
+
+# Scales at which JPEGs can be decoded in draft mode, the scale of the first decode to find the tiling
+# and the minimum size of a tile in pixels at the chosen scale, see Image.load_draft_pixels.
+# Below that size, the spot checks of the dot-detection start to miss dots.
+DRAFT_SCALES = (8, 4, 2)
+DRAFT_PROBE_SCALE = 4
+DRAFT_MIN_TILE_SIZE = 40
+
+# Compact dtypes used throughout the pipeline: colours are stored as RGB-triples of uint8, as they come
+# from the JPEG, coordinates of tiles as int16 and flat indices of tiles as int32. Where a single
+# number per colour is handier, e.g. as key for sorting or counting, see pack_colours.
+COLOUR_DTYPE = np.uint8
+COORDINATE_DTYPE = np.int16
+INDEX_DTYPE = np.int32
+
 
 class Image(object):
     # VERY ingenuous class name for a class to handle all things related to an image,
     # like loading, cutting it to size and extracting the amount of tiles, fixed and moveable.
-
-    def __init__(self, file_name) -> None:
+    # All of these stages are only computed when they are first accessed and then cached,
+    # so e.g. asking for the tiling does not trigger the colour extraction.
+    # All stages work on one shared numpy buffer of the cut image, see pixels.
+
+    # Stages in order of their dependency, see computed_stages:
+    STAGES = ('pixels', 'tiling', 'fixed_tiles', 'tile_colours')
+
+    def __init__(
+        self,
+        file_name: str,
+        source: Union[bytes, BinaryIO, np.ndarray] = None,
+        cut: bool = True,
+        draft: bool = False,
+    ) -> None:
+        # The image is loaded from file_name, unless a source is given, in which case file_name
+        # only names the image, e.g. for the output. See from_bytes, from_buffer and from_array.
+        # If cut is False, the source is taken to be cut to size already.
+        # With draft, JPEGs are decoded at reduced resolution, see load_draft_pixels.
         self.file_name = file_name
-        self.image = self.cut_to_size(
-            self.load_image(file_name)
-        )
+        self._source = source
+        self._cut = cut
+        self._draft = draft
+        self._image = None
 
-        self.tiling = self.count_tiling(self.image)
-        self.fixed_tiles = self.get_fixed_tile_positions()
-        self.tile_colours = self.get_tile_colours()
+        # Factor by which the pixels are smaller than the original screenshot, known once they are loaded:
+        self.draft_scale = 1
 
         super().__init__()
 
+    @classmethod
+    def from_bytes(cls, data: bytes, name: str = 'screenshot', draft: bool = False) -> 'Image':
+        # Image from the encoded bytes of a screenshot, e.g. an upload.
+        return cls(name, source=bytes(data), draft=draft)
+
+    @classmethod
+    def from_buffer(cls, fp: BinaryIO, name: str = None, draft: bool = False) -> 'Image':
+        # Image from a binary file-like object. It is read right away, so the caller may close it afterwards.
+        return cls(name if name is not None else getattr(fp, 'name', 'screenshot'), source=fp.read(), draft=draft)
+
+    @classmethod
+    def from_array(cls, pixels: np.ndarray, name: str = 'screenshot', cut: bool = True) -> 'Image':
+        # Image from a decoded screenshot of shape (height, width, 3). Pass cut=False if it has been
+        # cut to size already, e.g. if it is the pixels of another Image.
+        return cls(name, source=np.asarray(pixels, dtype=COLOUR_DTYPE), cut=cut)
+
+    @cached_property
+    def pixels(self) -> np.ndarray:
+        # The loaded and cut image as array of shape (height, width, 3).
+        source = self.file_name if self._source is None else self._source
+        if isinstance(source, np.ndarray):
+            pix = source
+        elif self._draft:
+            with stage('load_image'):
+                return self.load_draft_pixels(source)
+        else:
+            with stage('load_image'):
+                pix = np.asarray(self.load_image(io.BytesIO(source) if isinstance(source, bytes) else source, name=self.file_name))
+
+        if not self._cut:
+            return pix
+        with stage('cut_to_size'):
+            return cut_array_to_size(pix)
+
+    @property
+    def image(self) -> PILImage:
+        # PIL-version of pixels, as needed for the filters and the tile-cropping.
+        if self._image is None:
+            self._image = PILImage.fromarray(self.pixels)
+        return self._image
+
+    @image.setter
+    def image(self, image: PILImage) -> None:
+        # The stages computed from the previous pixels no longer apply and are computed anew on access:
+        for name in self.STAGES[1:]:
+            self.__dict__.pop(name, None)
+        self.pixels = np.asarray(image)
+        self._image = image
+
+    @cached_property
+    @instrumented('count_tiling')
+    def tiling(self) -> List[int]:
+        return count_tiling_from_scanlines(self.pixels)
+
+    @cached_property
+    @instrumented('fixed_tiles')
+    def fixed_tiles(self) -> List[Tuple[int, int]]:
+        return self.get_fixed_tile_positions()
+
+    @cached_property
+    @instrumented('tile_colours')
+    def tile_colours(self) -> np.ndarray:
+        return self.get_tile_colours()
+
+    @property
+    def computed_stages(self) -> List[str]:
+        """
+        Returns the names of the stages which have been computed (or set) so far,
+        in the order of STAGES.
+        """
+        return [stage for stage in self.STAGES if stage in self.__dict__]
+
     @staticmethod
-    def load_image(file_name: str) -> PILImage:
+    def load_image(file_name: Union[str, BinaryIO], name: str = None) -> PILImage:
+        # Also takes a binary file-like object instead of a file name, as PIL does.
+        # The name is what gets logged, it defaults to file_name.
         im = PILImage.open(file_name)
-        logger.info(f'Filename {file_name} loaded.\n      Format: {im.size}, {im.format}, {im.mode}')
+        logger.info(f'Filename {name if name is not None else file_name} loaded.\n      Format: {im.size}, {im.format}, {im.mode}')
         return im
 
+    def load_draft_pixels(self, source: Union[str, bytes]) -> np.ndarray:
+        """
+        Decodes a JPEG directly at reduced resolution with PIL's draft mode and returns the cut pixels.
+        A first decode at DRAFT_PROBE_SCALE gives the tiling, from which the coarsest of DRAFT_SCALES
+        is chosen that still leaves every tile DRAFT_MIN_TILE_SIZE pixels, such that dots and
+        majority colours come out as at full resolution. A wrong tiling of the probe tends to have
+        too many tiles, so the choice then errs on the side of the finer scale.
+        Other formats are decoded at full resolution.
+        """
+        def decode(scale: int) -> Tuple[np.ndarray, int]:
+            im = self.load_image(io.BytesIO(source) if isinstance(source, bytes) else source, name=self.file_name)
+            full_width = im.size[0]
+            if im.format == 'JPEG' and scale > 1:
+                im.draft('RGB', (im.size[0] // scale, im.size[1] // scale))
+            pix = cut_array_to_size(np.asarray(im.convert('RGB')))
+            return pix, round(full_width / im.size[0])
+
+        pix, probe_scale = decode(DRAFT_PROBE_SCALE)
+        if probe_scale == 1:
+            return pix
+
+        tiling = count_tiling_from_scanlines(pix)
+        tile_size = probe_scale * min(pix.shape[1] / max(tiling[0], 1), pix.shape[0] / max(tiling[1], 1))
+        scale = next((s for s in DRAFT_SCALES if tile_size / s >= DRAFT_MIN_TILE_SIZE), 1)
+        if scale != probe_scale:
+            pix, scale = decode(scale)
+
+        self.draft_scale = scale
+        logger.info(f'Decoded {self.file_name} in draft mode at 1/{scale} of the resolution.')
+
+        return pix
+
     @staticmethod
     def cut_to_size(image: PILImage) -> PILImage:
         # Takes a matplotlib-image and cuts it to size by removing the dark parts
         # which are top and bottom of the image.
         # Returns a matplotlib-image again, which should only contain the tiles.
-        pix = np.asarray(image)
-
-        for pixel in get_background_pixels(pix):
-            single_colour_rows = is_single_colour(
-                pix, 
-                target_colour=pixel,
-                majority_vote_threshold=0.95,
-            )
-            pix = pix[~single_colour_rows, :, :]
-
-            logger.debug(f'Cut image to size: {pix.shape}, removed all lines with colour {pixel}.')
-
-        return PILImage.fromarray(pix)
+        return PILImage.fromarray(cut_array_to_size(np.asarray(image)))
 
     @staticmethod
-    def count_tiling(image: PILImage) -> List[int]:
+    def count_tiling(image: PILImage, fast: bool = True) -> List[int]:
         # Takes an image and by counting the different colours per row and column
         # determines the amount of different tiles we have.
         # We have to do this with a Fourier-analysis of the rows/columns, as the screenshots 
         # come in as lossily compressed images with lots of noise.
         # As we want to look at colour changes, we take the man colour values as indicator for that.
+        # By default, we only look at a few scanlines, see count_tiling_from_scanlines.
+        if fast:
+            return count_tiling_from_scanlines(np.asarray(image))
+
         filtered_matrix = np.asarray(
             image.filter(PILImageFilter.FIND_EDGES)
         ).mean(axis=2)
@@ -92,14 +232,9 @@ class Image(object):
         # fixed and which are movable. The fixed ones have a dark spot in the middle.
         # The dark dots have pixel colour values in the 30's and it can be assumed that there is
         # a certain colour-distance to the rest of the somewhat uniformly coloured tile.
-        fixed_tiles = [
-            (i, j)  
-            for j in range(self.tiling[1])
-            for i in range(self.tiling[0]) 
-            if self.tile_has_dot(
-                self.get_tile(i, j)
-            )
-        ]
+        # All tiles are checked at once on the full image array, with the same spot checks
+        # as in tile_has_dot.
+        fixed_tiles = get_dotted_tiles(self.pixels, self.tiling)
 
         logger.info(f'Detected {len(fixed_tiles)} dotted tiles.')
 
@@ -109,7 +244,7 @@ class Image(object):
     def tile_has_dot(tile: PILImage) -> bool:
         # We do spot checks in five positions, one of which is the center-point.
         # We require all to be reasonably close to each other.
-        pic = np.asarray(tile).astype(int)
+        pic = np.asarray(tile)
 
         offsets = [s // 10 for s in pic.shape[:2]]
 
@@ -126,29 +261,58 @@ class Image(object):
             pic[pic.shape[0] - offsets[0], offsets[1], :],
             pic[pic.shape[0] - offsets[0], pic.shape[1] - offsets[1], :],
             pic[pic.shape[0] // 2, pic.shape[1] // 2, :],
-        ], dtype=int).reshape((-1, 1, 3))
+        ], dtype=COLOUR_DTYPE).reshape((-1, 1, 3))
 
         # Check whether all five entries of the generated array are of a single colour.
         # If not, then we have a tile.
         return not is_single_colour(
-            pixels, axis=1, target_colour=pixels[0, 0, :], colour_distance_threshold=20.0, majority_vote_threshold=0.90
+            pixels,
+            axis=1,
+            target_colour=pixels[0, 0, :],
+            colour_distance_threshold=DOT_COLOUR_DISTANCE_THRESHOLD,
+            majority_vote_threshold=DOT_MAJORITY_VOTE_THRESHOLD,
         )
 
     def get_tile_colours(self) -> np.ndarray:
         # For each of the identified tiles above, we determine the major colour and store
         # it in a matrix as a look-up. We will use the PIL-axis-notation for consistency,
         # not the flipped notation that a transformation to numpy normally would give.
-        majority_colours = np.zeros((self.tiling[0], self.tiling[1], 3), dtype=int)
+        # All tiles are processed in one go on the full image array, which gives the same
+        # result as calling get_majority_colour on each tile from get_tile.
+        return get_majority_colours_per_tile(self.pixels, self.tiling)
+
+# ======================== Some helper methods ===================================================
 
-        for col in range(self.tiling[0]):
-            for row in range(self.tiling[1]):
-                majority_colours[col, row, :] = get_majority_colour(
-                    self.get_tile(col, row)
-                )
+def cut_array_to_size(pix: np.ndarray, chunk_rows: int = 64) -> np.ndarray:
+    """
+    Array-version of Image.cut_to_size: removes all rows of the background colours
+    from the image array of shape (m, n, 3).
+    This gives the same result as calling is_single_colour for each background colour one
+    after the other, but works in a single pass over blocks of rows in a small dtype, so that
+    we never hold a full-size copy of the image. If the remaining rows form one band, which
+    is the normal case for a screenshot, a view into pix is returned instead of a copy.
+    """
+    background_colours = get_background_pixels(pix)
 
-        return majority_colours
+    # A pixel matches, if its mean channel distance is within the threshold. The sum of the 
+    # three channel distances is at most 765, so we can look the comparison up for each sum,
+    # see colour_distances:
+    is_close = (np.arange(3 * 255 + 1) / 3) <= CUT_COLOUR_DISTANCE_THRESHOLD
 
-# ======================== Some helper methods ===================================================
+    keep = np.ones(pix.shape[0], dtype=bool)
+    for start in range(0, pix.shape[0], chunk_rows):
+        block = pix[start:start + chunk_rows]
+        for colour in background_colours:
+            matches = is_close[colour_distances(block, colour)]
+            keep[start:start + chunk_rows] &= ~(matches.mean(axis=1) >= CUT_MAJORITY_VOTE_THRESHOLD)
+
+    logger.debug(f'Cut image to size: removed {(~keep).sum()} lines with colours {[c.tolist() for c in background_colours]}.')
+
+    kept_rows = np.flatnonzero(keep)
+    if len(kept_rows) > 0 and kept_rows[-1] - kept_rows[0] + 1 == len(kept_rows):
+        return pix[kept_rows[0]:kept_rows[-1] + 1]
+
+    return pix[keep]
 
 def get_background_pixels(image_array: np.ndarray) -> Tuple[np.ndarray]:
     # Identifies the background pixels of an image by assuming that the first and the last
@@ -157,6 +321,23 @@ def get_background_pixels(image_array: np.ndarray) -> Tuple[np.ndarray]:
     # The last pixel in a phone screenshot it the background of the app itself, which is usually not totally black.
     return image_array[0, 0, :], image_array[-1, -1, :]
 
+def colour_distances(pixels: np.ndarray, colour: np.ndarray) -> np.ndarray:
+    """
+    Returns the sum of the absolute channel differences between every pixel of an array of shape (..., 3)
+    and the given colour, as array of shape (...). The mean channel distance is a third of it.
+    For uint8-pixels, the differences are taken as max - min in uint8, such that no upcast copy
+    of the pixels is made, and only the sum over the channels is done in uint16. Other integer
+    pixels are compared in at least int32, floats as they are.
+    """
+    pixels, colour = np.asarray(pixels), np.asarray(colour)
+    if pixels.dtype == COLOUR_DTYPE and (colour.dtype == COLOUR_DTYPE or np.all((colour >= 0) & (colour <= 255))):
+        colour = colour.astype(COLOUR_DTYPE, copy=False)
+        deltas = np.maximum(pixels, colour)
+        deltas -= np.minimum(pixels, colour)
+        return deltas.sum(axis=-1, dtype=np.uint16)
+
+    return np.abs(np.subtract(pixels, colour, dtype=np.result_type(pixels, colour, np.int32))).sum(axis=-1)
+
 def is_single_colour(
     matrix: np.ndarray,
     axis: int = 0,
@@ -183,12 +364,12 @@ def is_single_colour(
     2) If you chose axis = 1 and majority_vote = 0.50, you search along each column, meaning that your output will
     be an array of the shape of (n,), indicating in which column at least 50% of the pixels match the target colour.
     """    
-    # Calculate the colour-distance for each pixel:
-    delta_colour = np.abs(matrix.astype(int) - target_colour).mean(axis=2)
+    # Calculate the colour-distance for each pixel, as sum over the channels, i.e. three times the mean:
+    delta_colour = colour_distances(matrix, target_colour)
     
     # We are only interested in matches which are sufficiently close to the target colour,
     # indicated by colour_distance_threshold.
-    matches = delta_colour <= colour_distance_threshold
+    matches = delta_colour <= 3 * colour_distance_threshold
 
     # We now need aggregate along the axis of which we want to get the majority-vote on:
     aggregation_axis = 1 if axis == 0 else 0
@@ -204,6 +385,166 @@ def get_majority_colour(image: PILImage) -> np.ndarray:
     vals, counts = np.unique(pixel_list, axis=0, return_counts=True)
     majority_colour = vals[np.argmax(counts)]
 
-    logger.debug(f'Identified majority colour {majority_colour} with a count of {counts.max()} / {len(pixel_list)} = {100 * counts.max() / len(pixel_list):.1f} %.')
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f'Identified majority colour {majority_colour} with a count of {counts.max()} / {len(pixel_list)} = {100 * counts.max() / len(pixel_list):.1f} %.')
 
     return majority_colour
+
+def _tile_boundaries(length: int, n_tiles: int) -> np.ndarray:
+    """
+    Returns the n_tiles + 1 pixel boundaries of the tiles along one axis, rounded
+    the same way as PIL does it when cropping the tiles in Image.get_tile.
+    """
+    tile_width = length / n_tiles
+    return np.asarray([int(round(k * tile_width)) for k in range(n_tiles + 1)], dtype=int)
+
+def _find_edges_along_rows(image_array: np.ndarray, rows: np.ndarray) -> np.ndarray:
+    """
+    Applies the same 3x3-kernel as PIL's FIND_EDGES, but only along the given rows, and returns
+    the edge responses averaged over the colour channels as matrix of shape (len(rows), width).
+    Border pixels have no response.
+    """
+    rows = np.clip(rows, 1, image_array.shape[0] - 2)
+    responses = np.zeros((len(rows), image_array.shape[1]), dtype=float)
+
+    for k, row in enumerate(rows):
+        block = image_array[row - 1:row + 2].astype(np.int16)
+        neighbours = block[:, :-2] + block[:, 1:-1] + block[:, 2:]
+        edges = 9 * block[1, 1:-1] - neighbours.sum(axis=0)
+        responses[k, 1:-1] = np.clip(edges, 0, 255).mean(axis=1)
+
+    return responses
+
+def _tiling_scanlines(image_array: np.ndarray, n_scanlines: int) -> Tuple[np.ndarray, np.ndarray]:
+    # Returns the squared edge responses along rows and columns, see count_tiling_from_scanlines.
+    # The scanlines are spread with the golden ratio, such that they never line up with the tiling.
+    positions = ((np.arange(n_scanlines) + 0.5) * (np.sqrt(5) - 1) / 2) % 1
+    height, width = image_array.shape[:2]
+
+    row_signals = _find_edges_along_rows(image_array, (positions * height).astype(int))
+    column_signals = _find_edges_along_rows(image_array.transpose(1, 0, 2), (positions * width).astype(int))
+
+    # As in get_major_frequencies_from_matrix, the differences are emphasised by squaring:
+    return row_signals ** 2, column_signals ** 2
+
+def count_tiling_from_scanlines(image_array: np.ndarray, n_scanlines: int = 16) -> List[int]:
+    """
+    Fast version of Image.count_tiling: Instead of filtering the whole image, the edges are
+    only computed along a few rows and columns, and each of them is analysed for its main frequency.
+    A single scanline can be misleading, e.g. when it runs through the dots or right along a 
+    tile border, so the tiling is the frequency most scanlines agree on.
+    """
+    return count_tilings_from_scanlines([image_array], n_scanlines=n_scanlines)[0]
+
+def count_tilings_from_scanlines(image_arrays: List[np.ndarray], n_scanlines: int = 16) -> List[List[int]]:
+    """
+    Batch version of count_tiling_from_scanlines for many images: The scanlines of all images
+    go through one batched FFT per signal length, see get_major_frequencies_batched.
+    """
+    signals = []
+    for image_array in image_arrays:
+        row_signals, column_signals = _tiling_scanlines(image_array, n_scanlines)
+        signals.extend(row_signals)
+        signals.extend(column_signals)
+
+    frequencies = get_major_frequencies_batched(signals).reshape((len(image_arrays), 2, n_scanlines))
+
+    # Rows run along x, so they give the amount of tiles in x, columns vice versa:
+    tilings = [[int(round(vote(f[0]))), int(round(vote(f[1])))] for f in frequencies]
+
+    for tiling in tilings:
+        logger.info(f'Detected tiling: {tiling}.')
+
+    return tilings
+
+def get_dotted_tiles(image_array: np.ndarray, tiling: List[int]) -> List[Tuple[int, int]]:
+    """
+    Returns the list of tiles which have a dot in them, in the same order and with the same
+    result as calling Image.tile_has_dot for every tile. Instead of cropping every tile, the
+    five sample coordinates of every tile are calculated at once and gathered from the full image array.
+    """
+    N_x, N_y = tiling
+    x_bounds = _tile_boundaries(image_array.shape[1], N_x)
+    y_bounds = _tile_boundaries(image_array.shape[0], N_y)
+
+    # Per tile: origin, size and inset offsets, in the same way as tile_has_dot calculates them.
+    # Everything along y is a column vector, everything along x a row vector, so that they
+    # broadcast to matrices of shape (N_y, N_x):
+    left, width = x_bounds[np.newaxis, :-1], np.diff(x_bounds)[np.newaxis, :]
+    upper, height = y_bounds[:-1, np.newaxis], np.diff(y_bounds)[:, np.newaxis]
+    offset_y, offset_x = height // 10, width // 10
+
+    # Absolute coordinates of the four inset corner points and the center-point, shape (5, N_y, N_x):
+    sample_y = upper + np.stack([offset_y, offset_y, height - offset_y, height - offset_y, height // 2])
+    sample_x = left + np.stack([offset_x, width - offset_x, offset_x, width - offset_x, width // 2])
+    sample_y = np.minimum(sample_y, image_array.shape[0] - 1)
+    sample_x = np.minimum(sample_x, image_array.shape[1] - 1)
+
+    pixels = image_array[sample_y, sample_x, :].reshape((5, -1, 3))
+    has_dot = ~is_single_colour(
+        pixels,
+        axis=1,
+        target_colour=pixels[0],
+        colour_distance_threshold=DOT_COLOUR_DISTANCE_THRESHOLD,
+        majority_vote_threshold=DOT_MAJORITY_VOTE_THRESHOLD,
+    )
+
+    # The flattened order is along x first and then along y, as in get_fixed_tile_positions:
+    return [(k % N_x, k // N_x) for k in np.flatnonzero(has_dot).tolist()]
+
+def pack_colours(pixels: np.ndarray) -> np.ndarray:
+    """
+    Packs the RGB-values of an array of shape (..., 3) into one integer key per pixel
+    of the form R << 16 | G << 8 | B. Ordering of the keys is the same as the
+    lexicographic ordering of the (R, G, B)-tuples.
+    The keys are built up in place, such that only one array of uint32 per pixel is allocated.
+    """
+    keys = pixels[..., 0].astype(np.uint32)
+    for channel in (1, 2):
+        keys <<= 8
+        np.bitwise_or(keys, pixels[..., channel], out=keys, casting='unsafe')
+    return keys
+
+def unpack_colours(keys: np.ndarray) -> np.ndarray:
+    """
+    Inverse of pack_colours, returns an array of shape (..., 3).
+    """
+    keys = np.asarray(keys)
+    return np.stack([(keys >> 16) & 0xFF, (keys >> 8) & 0xFF, keys & 0xFF], axis=-1).astype(COLOUR_DTYPE)
+
+def get_majority_colours_per_tile(image_array: np.ndarray, tiling: List[int]) -> np.ndarray:
+    """
+    Returns the most prevalent colour of every tile as a matrix of shape (tiling[0], tiling[1], 3)
+    and dtype uint8, in PIL-axis-notation. Gives the same result as calling get_majority_colour on every tile,
+    including the tie-breaking (smallest colour wins), but does it in one pass:
+    Every pixel gets a key made of its tile-index and its packed colour, all keys are
+    sorted once and the longest run of equal keys per tile gives the majority colour.
+    """
+    N_x, N_y = tiling
+    height, width = image_array.shape[:2]
+
+    # Label every pixel column and row with the tile it belongs to:
+    x_labels = np.repeat(np.arange(N_x), np.diff(_tile_boundaries(width, N_x)))
+    y_labels = np.repeat(np.arange(N_y), np.diff(_tile_boundaries(height, N_y)))
+    tile_labels = x_labels[np.newaxis, :] * N_y + y_labels[:, np.newaxis]
+
+    # With at most 256 tiles, tile-index and colour fit into 32 bits, which halves the memory of the sort:
+    keys = tile_labels.astype(np.uint32 if N_x * N_y <= 256 else np.uint64) << 24
+    keys |= pack_colours(image_array)
+    keys = np.sort(keys, axis=None)
+
+    # Find the runs of equal keys, i.e. the count of every colour within each tile:
+    run_starts = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1])))
+    run_counts = np.diff(np.append(run_starts, len(keys)))
+    run_keys = keys[run_starts]
+    run_tiles = run_keys >> 24
+
+    # Order by tile, then by descending count, then by ascending colour, and take the first per tile:
+    order = np.lexsort((run_keys, -run_counts, run_tiles))
+    is_first = np.concatenate(([True], run_tiles[order][1:] != run_tiles[order][:-1]))
+    winners = order[is_first]
+
+    majority_colours = np.zeros((N_x * N_y, 3), dtype=COLOUR_DTYPE)
+    majority_colours[run_tiles[winners]] = unpack_colours(run_keys[winners] & 0xFFFFFF)
+
+    return majority_colours.reshape((N_x, N_y, 3))
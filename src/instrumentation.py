@@ -0,0 +1,154 @@
+"""
+Lightweight per-stage instrumentation of the pipeline. Functions are marked as stage with the
+instrumented-decorator, or a block of code with the stage-context manager. When instrumentation
+is enabled, every stage records its wall time, CPU time and, if asked for, the peak memory
+traced by tracemalloc, and hands the record to all registered sinks.
+When disabled, which is the default, a stage costs a single flag check.
+"""
+import functools
+import json
+import logging
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Callable, Iterator, List, NamedTuple, Optional
+
+# Set up logging:
+console_handler = logging.StreamHandler()
+console_handler.setFormatter(logging.Formatter('%(name)s - %(levelname)s: %(message)s'))
+logger = logging.getLogger('instrumentation')
+logger.setLevel('INFO')
+logger.addHandler(console_handler)
+logger.propagate = False
+
+
+class StageMetrics(NamedTuple):
+    stage: str
+    wall_time: float
+    cpu_time: float
+    # Peak of the memory allocated within the stage in bytes, None if memory is not traced:
+    peak_memory: Optional[int] = None
+
+
+class _Settings(object):
+    enabled = False
+    trace_memory = False
+    # Whether tracemalloc was started by us, such that disable only stops it in that case:
+    started_tracing = False
+    sinks: List[Callable[[StageMetrics], None]] = []
+    # Per running stage the traced memory at its start and the highest peak of its nested stages,
+    # as each stage resets the peak of tracemalloc:
+    memory_stack: List[List[int]] = []
+
+
+def enable(trace_memory: bool = False) -> None:
+    """
+    Switches the instrumentation on. With trace_memory, tracemalloc is started as well, which
+    makes the pipeline noticeably slower, so the timings should not be taken at face value then.
+    """
+    _Settings.enabled = True
+    _Settings.trace_memory = trace_memory
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        _Settings.started_tracing = True
+
+def disable() -> None:
+    _Settings.enabled = False
+    _Settings.trace_memory = False
+    if _Settings.started_tracing:
+        tracemalloc.stop()
+        _Settings.started_tracing = False
+
+def is_enabled() -> bool:
+    return _Settings.enabled
+
+def add_sink(sink: Callable[[StageMetrics], None]) -> None:
+    """
+    Registers a callable which is handed every StageMetrics as soon as the stage is finished,
+    e.g. to forward them to a metrics system.
+    """
+    _Settings.sinks.append(sink)
+
+def remove_sink(sink: Callable[[StageMetrics], None]) -> None:
+    _Settings.sinks.remove(sink)
+
+@contextmanager
+def collect(records: List[StageMetrics]) -> Iterator[List[StageMetrics]]:
+    """
+    Appends the metrics of all stages finished within the context to the list records.
+    """
+    add_sink(records.append)
+    try:
+        yield records
+    finally:
+        remove_sink(records.append)
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """
+    Records the code in the context as stage of the given name.
+    """
+    if not _Settings.enabled:
+        yield
+        return
+
+    tracing = _Settings.trace_memory and tracemalloc.is_tracing()
+    if tracing:
+        _Settings.memory_stack.append([tracemalloc.get_traced_memory()[0], 0])
+        tracemalloc.reset_peak()
+
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+    try:
+        yield
+    finally:
+        wall_time, cpu_time = time.perf_counter() - wall_start, time.process_time() - cpu_start
+
+        peak_memory = None
+        if tracing:
+            start, nested_peak = _Settings.memory_stack.pop()
+            peak = max(tracemalloc.get_traced_memory()[1], nested_peak)
+            peak_memory = peak - start
+            if _Settings.memory_stack:
+                _Settings.memory_stack[-1][1] = max(_Settings.memory_stack[-1][1], peak)
+
+        record = StageMetrics(name, wall_time, cpu_time, peak_memory)
+        for sink in list(_Settings.sinks):
+            sink(record)
+
+def instrumented(name: str) -> Callable:
+    """
+    Decorator which records every call of the decorated function as stage of the given name.
+    """
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _Settings.enabled:
+                return func(*args, **kwargs)
+            with stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def format_metrics(records: List[StageMetrics], **context) -> str:
+    """
+    Returns the records as a single JSON line, with the given context, e.g. the file name, on top.
+    Times are given in milliseconds, memory in bytes.
+    """
+    return json.dumps({
+        **context,
+        'stages': [
+            {
+                'stage': record.stage,
+                'wall_ms': round(1e3 * record.wall_time, 3),
+                'cpu_ms': round(1e3 * record.cpu_time, 3),
+                **({'peak_memory': record.peak_memory} if record.peak_memory is not None else {}),
+            }
+            for record in records
+        ],
+    })
+
+def log_sink(record: StageMetrics) -> None:
+    """
+    Sink which logs every stage as it finishes, see add_sink.
+    """
+    logger.info(format_metrics([record]))
@@ -0,0 +1,143 @@
+"""
+On-disk cache for the results of solved screenshots. As the same puzzle screenshots
+come in again and again, we store everything we derived from an image under a hash of its
+pixel data and the algorithm settings, so that we can skip the whole pipeline next time.
+Every entry is a single npz-file, the least recently used ones get evicted once the
+cache grows beyond its size bound.
+"""
+import hashlib
+import logging
+import os
+import tempfile
+import zipfile
+from typing import Dict, Optional
+import numpy as np
+from . import image_manipulation
+
+# Set up logging:
+console_handler = logging.StreamHandler()
+console_handler.setFormatter(logging.Formatter('%(name)s - %(levelname)s: %(message)s'))
+logger = logging.getLogger('result_cache')
+logger.setLevel('INFO')
+logger.addHandler(console_handler)
+logger.propagate = False
+
+# Bump this whenever the stored format or any algorithm changes in a way the settings below do not cover.
+# 2: Tiling detected from scanlines, colours stored as uint8 and coordinates as int16.
+CACHE_VERSION = 2
+
+
+def settings_key() -> str:
+    """
+    Returns a string describing all settings which influence the results stored in the cache,
+    i.e. the thresholds of the cutting, the dot-detection and the defaults of is_single_colour.
+    If any of these change, all keys change and old entries are not used anymore.
+    """
+    return repr((
+        CACHE_VERSION,
+        image_manipulation.CUT_COLOUR_DISTANCE_THRESHOLD,
+        image_manipulation.CUT_MAJORITY_VOTE_THRESHOLD,
+        image_manipulation.DOT_COLOUR_DISTANCE_THRESHOLD,
+        image_manipulation.DOT_MAJORITY_VOTE_THRESHOLD,
+        image_manipulation.is_single_colour.__defaults__,
+    ))
+
+
+class ResultCache(object):
+    """
+    Content-addressed on-disk cache with LRU-eviction.
+
+    :param directory: Directory where the entries are stored, will be created if necessary.
+    :param max_entries: Maximum amount of entries. When exceeded, the least recently used are removed.
+    """
+    def __init__(self, directory: str, max_entries: int = 1000) -> None:
+        super().__init__()
+        self.directory = directory
+        self.max_entries = max_entries
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(pixels: np.ndarray, *extra_settings: str) -> str:
+        """
+        Hashes the pixel data (including its shape and dtype) together with the settings
+        and any further settings of the caller, e.g. the method used for the final ordering.
+        """
+        pixels = np.ascontiguousarray(pixels)
+        h = hashlib.sha256()
+        h.update(settings_key().encode())
+        h.update(repr(extra_settings).encode())
+        h.update(repr((pixels.shape, pixels.dtype.str)).encode())
+        h.update(pixels.data)
+        return h.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f'{key}.npz')
+
+    def get(self, key: str) -> Optional[Dict[str, np.ndarray]]:
+        """
+        Returns the stored arrays for the key or None, if there is no entry.
+        A hit marks the entry as recently used. An entry which can not be read, e.g. as it was
+        truncated, counts as miss and is removed.
+        """
+        path = self._path(key)
+        try:
+            with np.load(path) as f:
+                entry = {name: f[name] for name in f.files}
+        except OSError:
+            logger.debug(f'Cache miss for {key}.')
+            return None
+        except (ValueError, EOFError, KeyError, zipfile.BadZipFile) as e:
+            logger.warning(f'Removing unreadable cache entry {key}: {type(e).__name__}: {e}')
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+        logger.debug(f'Cache hit for {key}.')
+        return entry
+
+    def put(self, key: str, entry: Dict[str, np.ndarray]) -> None:
+        """
+        Stores the arrays under the key, merged into an already existing entry.
+        """
+        merged = self.get(key) or {}
+        merged.update({name: np.asarray(value) for name, value in entry.items()})
+
+        # Write to a temporary file first and then move it into place, so that concurrent
+        # workers never see a half-written entry:
+        handle, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(handle, 'wb') as f:
+            np.savez(f, **merged)
+        os.replace(tmp_path, self._path(key))
+
+        self.evict()
+
+    def evict(self) -> None:
+        """
+        Removes the least recently used entries until there are at most max_entries left.
+        """
+        paths = [os.path.join(self.directory, f) for f in os.listdir(self.directory) if f.endswith('.npz')]
+        if len(paths) <= self.max_entries:
+            return
+
+        def last_used(path):
+            try:
+                return os.path.getmtime(path)
+            except OSError:
+                return 0.0
+
+        for path in sorted(paths, key=last_used)[:len(paths) - self.max_entries]:
+            try:
+                os.remove(path)
+                logger.debug(f'Evicted {path} from cache.')
+            except OSError:
+                pass
+
+    def __len__(self) -> int:
+        return len([f for f in os.listdir(self.directory) if f.endswith('.npz')])
@@ -4,12 +4,13 @@ They also contain integrity checks which can be used in tests as well as on-the-
 check whether a given solution gives sensible results.
 """
 import logging
-from typing import List, Tuple
+from typing import BinaryIO, Iterator, List, Sequence, Tuple
 import numpy as np
-from collections import Counter
-from .final_ordering import find_final_ordering
-from .image_manipulation import Image
-from .state_visualisation import generate_solution_gif
+from .final_ordering import ORDERING_METHODS
+from .image_manipulation import COLOUR_DTYPE, COORDINATE_DTYPE, Image, pack_colours
+from .instrumentation import StageMetrics, collect, stage
+from .state_visualisation import generate_solution_gif, solution_to_bytes, write_solution
+from .result_cache import ResultCache
 
 # Set up logging:
 console_handler = logging.StreamHandler()
@@ -25,11 +26,47 @@ class Solution(object):
     def __init__(
         self, 
         image: Image, 
+        cache: ResultCache = None,
+        ordering_method: str = 'greedy',
     ) -> None:
         super().__init__()
+        if ordering_method not in ORDERING_METHODS:
+            raise ValueError(f'Unknown ordering method {ordering_method}, choose from {sorted(ORDERING_METHODS)}.')
+
         self.image = image
+        self.cache = cache
+        self.cache_key = None
+        self.ordering_method = ordering_method
+
+        # Metrics of all stages run from within the solution, if the instrumentation is enabled.
+        # Stages of the image which were already computed before are not included.
+        self.stage_metrics: List[StageMetrics] = []
+
+        with collect(self.stage_metrics):
+            self._prepare()
+
+    def _prepare(self) -> None:
+        image, cache, ordering_method = self.image, self.cache, self.ordering_method
+
+        # If we have seen this image before, we can take over all results of the image analysis
+        # and the final ordering from the cache:
+        cached = None
+        if cache is not None:
+            self.cache_key = cache.key(image.pixels, ordering_method)
+            cached = cache.get(self.cache_key)
+
+        if cached is not None:
+            image.tiling = cached['tiling'].tolist()
+            image.fixed_tiles = [tuple(t) for t in cached['fixed_tiles'].tolist()]
+            image.tile_colours = cached['tile_colours']
+            final_ordering, final_colouring = cached['final_ordering'], cached['final_colouring']
+            logger.info(f'Took image analysis and final ordering from cache entry {self.cache_key}.')
+        else:
+            # Run the image analysis up front, such that its stages are not counted into the final ordering:
+            image.fixed_tiles, image.tile_colours
+            final_ordering, final_colouring = ORDERING_METHODS[ordering_method](image)
+
         self.initial_colouring = image.tile_colours
-        final_ordering, final_colouring = find_final_ordering(image)
         self.final_ordering = final_ordering
         self.final_colouring = final_colouring
         self.steps = []
@@ -39,16 +76,53 @@ class Solution(object):
         # Perform a sanity check on initial and final state. We want to do this every time we
         # create a solution, as we can never be sure whether we are handed a proper image or something
         # upstream has silently failed.
-        if self.initial_state.is_sane() & self.final_state.is_sane():
+        with stage('sanity_check'):
+            is_sane = self.initial_state.is_sane() & self.final_state.is_sane()
+        if is_sane:
             logger.info('Successfully created solution object with sane fringe states, ready for solver method.')
         else:
             raise ValueError(f'State sanity violated! Initial state sane: {self.initial_state.is_sane()}, final state sane: {self.final_state.is_sane()}')
 
+        if cache is not None and cached is None:
+            cache.put(self.cache_key, {
+                'tiling': np.asarray(image.tiling, dtype=int),
+                'fixed_tiles': np.asarray(image.fixed_tiles, dtype=int).reshape((-1, 2)),
+                'tile_colours': image.tile_colours,
+                'final_ordering': final_ordering,
+                'final_colouring': final_colouring,
+            })
+
     def solve(self, solver) -> None:
+        with collect(self.stage_metrics):
+            self._solve(solver)
+
+    def _solve(self, solver) -> None:
+        # The swap list is cached per solver, so we look it up by the solver's name:
+        swaps_name = f'swaps_{solver.__name__}'
+        cached = self.cache.get(self.cache_key) if self.cache is not None else None
+
+        if cached is not None and swaps_name in cached:
+            self.steps = SwapLog(self.initial_colouring, cached[swaps_name])
+            logger.info(f'Took {len(self.steps)} steps of {solver.__name__} from cache entry {self.cache_key}.')
+            return
+
         self.steps = solver(self.initial_colouring, self.final_ordering)
 
-    def generate_gif(self) -> None:
-        generate_solution_gif(self)
+        if self.cache is not None:
+            self.cache.put(self.cache_key, {swaps_name: swaps_from_states(self.steps)})
+
+    def generate_gif(self, output_format: str = 'gif', output_dir: str = 'solutions') -> None:
+        with collect(self.stage_metrics):
+            generate_solution_gif(self, output_format=output_format, output_dir=output_dir)
+
+    def write(self, fp: BinaryIO, output_format: str = 'gif') -> None:
+        # Writes the solution to a binary stream instead of the solutions-folder.
+        with collect(self.stage_metrics):
+            write_solution(self.steps, fp, output_format=output_format)
+
+    def to_bytes(self, output_format: str = 'gif') -> bytes:
+        with collect(self.stage_metrics):
+            return solution_to_bytes(self.steps, output_format=output_format)
 
     def __str__(self) -> str:
         return f'Solution for image {self.image.file_name} in {len(self.steps)} steps.'
@@ -70,6 +144,26 @@ class State(object):
         self.swapped_elements = swapped_elements
         self.idx = idx
 
+    # The duplicates are cached, as the sanity is checked over and over again, and are recalculated
+    # when ordering or colouring are replaced. Changing them in place does not reset the cache.
+    @property
+    def ordering(self) -> np.ndarray:
+        return self._ordering
+
+    @ordering.setter
+    def ordering(self, ordering: np.ndarray) -> None:
+        self._ordering = ordering
+        self._duplicates = None
+
+    @property
+    def colouring(self) -> np.ndarray:
+        return self._colouring
+
+    @colouring.setter
+    def colouring(self, colouring: np.ndarray) -> None:
+        self._colouring = colouring
+        self._duplicates = None
+
     def __str__(self) -> str:
         is_sane = self.is_sane()
         s = f'State with index {self.idx} is {"NOT" if not is_sane else ""} sane.'
@@ -89,29 +183,38 @@ class State(object):
         return len(duplicates['coord_pair_duplicates']) == 0 and len(duplicates['colour_duplicates']) == 0
 
     def get_duplicates(self):
-        # As we want to check for coord/colour-tuples and as lists are not hashable and thus
-        # can not be used in the Counter-object, we have to first flatten the matrices to arrays,
-        # such that a matrix (N, M, x) becomes an array (N*M, x). We then convert to a list and from
-        # there to a tuple, which we can then use in the Counter-class.
-        coord_counter_dict = Counter(
-            [
-                tuple(coord_pair) 
-                for coord_pair 
-                in self.ordering.flatten().reshape((-1, 2)).tolist()
-            ]
-        )
-        colour_counter_dict = Counter(
-            [
-                tuple(colour) 
-                for colour 
-                in self.colouring.flatten().reshape((-1, 3)).tolist()
-            ]
-        )
-        return {
-            'coord_pair_duplicates': [k for k, v in coord_counter_dict.items() if v >= 2],
-            'colour_duplicates': [k for k, v in colour_counter_dict.items() if v >= 2]
-        }
+        # We flatten the matrices to arrays, such that a matrix (N, M, x) becomes an array (N*M, x),
+        # and look for rows which appear more than once, see _duplicate_rows.
+        if self._duplicates is None:
+            self._duplicates = {
+                'coord_pair_duplicates': _duplicate_rows(np.asarray(self.ordering).reshape((-1, 2))),
+                'colour_duplicates': _duplicate_rows(np.asarray(self.colouring).reshape((-1, 3))),
+            }
+        return self._duplicates
+
+
+def _duplicate_rows(rows: np.ndarray) -> List[Tuple]:
+    """
+    Returns the rows of a matrix of shape (n, k) which appear at least twice, as tuples and in the order
+    of their first appearance, i.e. the same as counting the tuples of the rows with a Counter.
+    Integer rows are packed into one key each, such that a sort of the keys suffices. Colours of
+    uint8 are packed into their 24-bit key, see pack_colours.
+    """
+    if len(rows) == 0:
+        return []
+
+    try:
+        if rows.dtype == COLOUR_DTYPE and rows.shape[1] == 3:
+            keys = pack_colours(rows)
+        else:
+            offsets = rows.min(axis=0).astype(np.int64)
+            keys = np.ravel_multi_index((rows - offsets).T, tuple((rows.max(axis=0) - offsets + 1).tolist()))
+    except (TypeError, ValueError):
+        # Not integer or too large a range to pack, so we let numpy find the unique rows:
+        keys = np.unique(rows, axis=0, return_inverse=True)[1].reshape(-1)
 
+    _, first, counts = np.unique(keys, return_index=True, return_counts=True)
+    return [tuple(row) for row in rows[np.sort(first[counts >= 2])].tolist()]
 
 def create_initial_ordering(ordering_template):
     """
@@ -121,7 +224,98 @@ def create_initial_ordering(ordering_template):
     """
     ordering = np.asarray(
         [(i, j) for i in range(ordering_template.shape[0]) for j in range(ordering_template.shape[1])],
-        dtype=int
+        dtype=COORDINATE_DTYPE
     ).reshape(ordering_template.shape)
 
     return ordering
+
+def swaps_from_states(states: Sequence['State']) -> np.ndarray:
+    """
+    Extracts the swapped elements of a list of states into a matrix of shape (n_steps, 4),
+    where each row is (i, j, i_in, j_in).
+    """
+    if isinstance(states, SwapLog):
+        return states.swaps
+
+    return np.asarray(
+        [[*state.swapped_elements[0], *state.swapped_elements[1]] for state in states],
+        dtype=COORDINATE_DTYPE,
+    ).reshape((-1, 4))
+
+
+class SwapLog(Sequence):
+    """
+    Compact representation of a solution: Instead of a full State per step, we only keep
+    the initial state and the swaps as a matrix of shape (n_steps, 4), where each row is 
+    (i, j, i_in, j_in). The States are reconstructed on demand, either by iterating, which
+    replays the swaps one after the other, or by indexing, which replays up to the requested step.
+    Memory is thus O(steps + tiles) instead of O(steps * tiles).
+    As it behaves like a read-only list of States, it can be used wherever a solver's
+    List[State] is expected.
+    """
+    def __init__(
+        self,
+        initial_colouring: np.ndarray,
+        swaps: np.ndarray,
+        initial_ordering: np.ndarray = None,
+    ) -> None:
+        super().__init__()
+        self.initial_colouring = initial_colouring
+        self.initial_ordering = (
+            initial_ordering if initial_ordering is not None else create_initial_ordering(initial_colouring[:, :, :2])
+        )
+        self.swaps = np.asarray(swaps, dtype=COORDINATE_DTYPE).reshape((-1, 4))
+
+        # The last reconstructed step, such that sequential indexing does not need to start over:
+        self._cursor = -1
+        self._ordering = None
+        self._colouring = None
+
+    def __len__(self) -> int:
+        return len(self.swaps)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[k] for k in range(*idx.indices(len(self)))]
+
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError(f'Step {idx} out of range for a solution with {len(self)} steps.')
+
+        if self._ordering is None or idx < self._cursor:
+            self._ordering = self.initial_ordering.copy()
+            self._colouring = self.initial_colouring.copy()
+            self._cursor = -1
+
+        for k in range(self._cursor + 1, idx + 1):
+            self._apply_swap(self._ordering, self._colouring, k)
+        self._cursor = idx
+
+        return self._state(self._ordering, self._colouring, idx)
+
+    def __iter__(self) -> Iterator['State']:
+        ordering = self.initial_ordering.copy()
+        colouring = self.initial_colouring.copy()
+
+        for k in range(len(self)):
+            self._apply_swap(ordering, colouring, k)
+            yield self._state(ordering, colouring, k)
+
+    def initial_state(self) -> 'State':
+        # The state before the first swap, e.g. as only frame of an already solved puzzle:
+        return State(self.initial_ordering.copy(), self.initial_colouring.copy())
+
+    def _apply_swap(self, ordering: np.ndarray, colouring: np.ndarray, k: int) -> None:
+        i, j, i_in, j_in = self.swaps[k]
+        ordering[[i, i_in], [j, j_in], :] = ordering[[i_in, i], [j_in, j], :]
+        colouring[[i, i_in], [j, j_in], :] = colouring[[i_in, i], [j_in, j], :]
+
+    def _state(self, ordering: np.ndarray, colouring: np.ndarray, k: int) -> 'State':
+        i, j, i_in, j_in = self.swaps[k].tolist()
+        return State(
+            ordering.copy(),
+            colouring.copy(),
+            swapped_elements=[(i, j), (i_in, j_in)],
+            idx=k,
+        )
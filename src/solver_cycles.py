@@ -0,0 +1,97 @@
+"""
+Solver to derive the steps from the initial to the final ordering with
+the minimal amount of swaps: The final ordering is a permutation of the tiles,
+which decomposes into cycles. A cycle of length m can be resolved with m - 1 swaps
+and not less, so the minimum amount of swaps is the number of tiles minus the number of cycles.
+"""
+import logging
+import typing
+import numpy as np
+from .image_manipulation import COORDINATE_DTYPE, INDEX_DTYPE
+from .solution_base import SwapLog
+from .solver_naive import naive_swaps
+from .instrumentation import instrumented
+
+# Set up logging:
+console_handler = logging.StreamHandler()
+console_handler.setFormatter(logging.Formatter('%(name)s - %(levelname)s: %(message)s'))
+logger = logging.getLogger('solver_cycles')
+logger.setLevel('INFO')
+logger.addHandler(console_handler)
+logger.propagate = False
+
+
+def cycle_decomposition(final_ordering: np.ndarray) -> typing.List[typing.List[int]]:
+    """
+    Decomposes the permutation given by the final ordering into its cycles, in linear time.
+    Positions are given as flat indices p = i * N_j + j. Each cycle starts with its smallest
+    position and lists the positions such that each one receives the tile from the next one.
+    Tiles which already are in place form cycles of length one.
+    """
+    N_i, N_j = final_ordering.shape[:2]
+    target = (final_ordering[:, :, 0].astype(INDEX_DTYPE) * N_j + final_ordering[:, :, 1]).flatten().tolist()
+    visited = [False] * (N_i * N_j)
+    cycles = []
+
+    for start in range(N_i * N_j):
+        if visited[start]:
+            continue
+
+        cycle = []
+        p = start
+        while not visited[p]:
+            visited[p] = True
+            cycle.append(p)
+            p = target[p]
+        cycles.append(cycle)
+
+    return cycles
+
+def minimum_swap_count(final_ordering: np.ndarray) -> int:
+    """
+    Returns the minimal amount of swaps needed to reach the final ordering: tiles minus cycles.
+    """
+    return final_ordering.shape[0] * final_ordering.shape[1] - len(cycle_decomposition(final_ordering))
+
+def cycle_swaps(final_ordering: np.ndarray) -> np.ndarray:
+    """
+    Derives the swaps which resolve the final ordering cycle by cycle.
+    For a cycle (p_0, p_1, ..., p_m-1), swapping p_k and p_k+1 for k = 0, ..., m - 2 puts
+    the correct tile into p_k, and the last swap puts the correct tiles into both positions.
+    Returns a matrix of shape (n_steps, 4), where each row (i, j, i_in, j_in) denotes
+    a swap of the tiles at positions (i, j) and (i_in, j_in).
+    """
+    N_j = final_ordering.shape[1]
+    cycles = [c for c in cycle_decomposition(final_ordering) if len(c) > 1]
+
+    if not cycles:
+        return np.zeros((0, 4), dtype=COORDINATE_DTYPE)
+
+    # Concatenate all cycles and pair every position with its successor, except
+    # for the last position of each cycle, which has no successor within that cycle:
+    positions = np.concatenate([np.asarray(c, dtype=INDEX_DTYPE) for c in cycles])
+    is_last = np.zeros(len(positions), dtype=bool)
+    is_last[np.cumsum([len(c) for c in cycles]) - 1] = True
+
+    p = positions[:-1][~is_last[:-1]]
+    p_in = positions[1:][~is_last[:-1]]
+
+    return np.stack([p // N_j, p % N_j, p_in // N_j, p_in % N_j], axis=1)
+
+@instrumented('solver')
+def cycle_method(
+    initial_colouring: np.ndarray,
+    final_ordering: np.ndarray,
+) -> SwapLog:
+    swaps = cycle_swaps(final_ordering)
+    n_tiles = final_ordering.shape[0] * final_ordering.shape[1]
+
+    # For comparison, the amount of steps naive_method takes for the same ordering:
+    n_naive = len(naive_swaps(final_ordering))
+
+    logger.info(
+        f'Solver reschuffled tiles in {len(swaps)} steps vs {n_naive} naive, the minimum for {n_tiles} tiles '
+        f'in {n_tiles - len(swaps)} cycles.'
+    )
+
+    return SwapLog(initial_colouring, swaps)
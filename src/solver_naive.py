@@ -6,7 +6,9 @@ its target colour.
 import logging
 import typing
 import numpy as np
-from .solution_base import State, create_initial_ordering
+from .image_manipulation import INDEX_DTYPE
+from .solution_base import SwapLog
+from .instrumentation import instrumented
 
 # Set up logging:
 console_handler = logging.StreamHandler()
@@ -17,70 +19,87 @@ logger.addHandler(console_handler)
 logger.propagate = False
 
 
-def naive_method(
-    initial_colouring: np.ndarray, 
-    final_ordering: np.ndarray,
-) -> typing.List[State]:
-
-    states = []
-    ordering = create_initial_ordering(final_ordering)
-    
-    # Create the colouring matrix to work on:
-    colouring = initial_colouring.copy()
-
-    # Go through from top left to bottom right and swap each element, that needs swapping:
-    for i in range(ordering.shape[0]):
-        for j in range(ordering.shape[1]):
-            # If the indices are not yet the same ...
-            if (final_ordering[i, j, :] != ordering[i, j, :]).any():
-                # ... swap the elements: If eventually some element with the original
-                # coordinate of (k, l) has to end up in (i, j), then after the swap,
-                # the ordering-matrix needs to agree with the final-ordering at (i, j)
-                # and the former entry in (i, j) has to be moved to the (k, l)-position.
-                k, l = final_ordering[i, j, :].tolist()
-                
-                # Find the source coordinates, i.e. where in ordering does the element (k, j)
-                # currently reside?
-                i_in, j_in = tuple(
-                    np.argwhere(
-                        (ordering[:, :, 0] == k) * (ordering[:, :, 1] == l)
-                    ).flatten().tolist()
-                )
+def naive_swaps(final_ordering: np.ndarray, initial_colouring: np.ndarray = None) -> np.ndarray:
+    """
+    Derives the swaps of the naive method, without keeping track of the colours:
+    Go through from top left to bottom right and swap in the tile which has to end up there.
+    Returns a matrix of shape (n_steps, 4), where each row (i, j, i_in, j_in) denotes
+    a swap of the tiles at positions (i, j) and (i_in, j_in).
+    The initial colouring is only needed for the debug output of the colouring after each swap.
+    """
+    N_i, N_j = final_ordering.shape[:2]
+
+    # We work on flat indices, p = i * N_j + j, as plain Python lists are much faster
+    # to index element-wise than numpy arrays:
+    # ordering[p] is the original tile currently at position p, position[t] is the position
+    # where the original tile t can currently be found, i.e. the inverse of ordering.
+    # With the inverse index, finding a tile is O(1) and the whole solver is linear in the tiles.
+    target = (final_ordering[:, :, 0].astype(INDEX_DTYPE) * N_j + final_ordering[:, :, 1]).flatten().tolist()
+    ordering = list(range(N_i * N_j))
+    position = list(range(N_i * N_j))
+    swaps = []
+
+    # Formatting the debug messages costs more than the swaps themselves, so we only do it when asked to:
+    debug = logger.isEnabledFor(logging.DEBUG)
+
+    for p in range(N_i * N_j):
+        t = target[p]
+
+        # If the tile at p is not yet the one which should end up there ...
+        if ordering[p] != t:
+            # ... swap the elements: If eventually the original tile t has to end up in p,
+            # then after the swap, the ordering needs to agree with the target at p
+            # and the former entry in p has to be moved to where t was.
+            p_in = position[t]
+            o = ordering[p]
+
+            if debug:
+                logger.debug('----------------------------Switching step %d-------------------------', len(swaps))
+                logger.debug('At tile %s, we expect to be tile %s.', divmod(p, N_j), divmod(t, N_j))
+                logger.debug('Tile %s can currently be found at position %s.', divmod(t, N_j), divmod(p_in, N_j))
+                logger.debug('Before switching, ordering looks like this: %s', _ordering_matrix(ordering, N_i, N_j))
 
-                logger.debug(f'----------------------------Switching step {len(states)}-------------------------')
-                logger.debug(f'At tile {(i, j)}, we expect to be tile {(k, l)}.')
-                logger.debug(f'Tile {(k, l)} can currently be found at position {(i_in, j_in)}.')
-                logger.debug(f'Before switching, ordering looks like this: {ordering}')
-
-                # Do the switches, ...:
-                tmp = ordering[i, j, :].copy()
-                ordering[i, j, :] = ordering[i_in, j_in, :]
-                ordering[i_in, j_in, :] = tmp.copy()
-
-                tmp = colouring[i, j, :].copy()
-                colouring[i, j, :] = colouring[i_in, j_in, :]
-                colouring[i_in, j_in, :] = tmp.copy()
-
-                # ... log the new position of the original (i, j)-element:
-                logger.debug(f'After switching, ordering looks like this: {ordering}')
-                logger.debug(f'After switching, colouring looks like this: {colouring}')
-
-                # and generate a new State and add it to the list:
-                states.append(
-                    State(
-                        ordering.copy(),
-                        colouring.copy(),
-                        swapped_elements=[(i, j), (i_in, j_in)],
-                        idx=len(states),
+            ordering[p], ordering[p_in] = t, o
+            position[t], position[o] = p, p_in
+            swaps.append((p, p_in))
+
+            if debug:
+                logger.debug('After switching, ordering looks like this: %s', _ordering_matrix(ordering, N_i, N_j))
+                if initial_colouring is not None:
+                    logger.debug(
+                        'After switching, colouring looks like this: %s',
+                        initial_colouring.reshape((-1, 3))[ordering].reshape(initial_colouring.shape),
                     )
+                logger.debug(
+                    'Processed tile %s: Swapped in for tile %s from %s, created state number %d.',
+                    divmod(p, N_j), divmod(t, N_j), divmod(p_in, N_j), len(swaps) - 1,
                 )
 
-                logger.debug(f'Processed tile {(i, j)}: Swapped in for tile {(k, l)}, created state number {len(states) - 1}.')
+        elif debug:
+            logger.debug('Processed tile %s: Fixed tile, nothing to do.', divmod(p, N_j))
+
+    swaps = np.asarray(swaps, dtype=INDEX_DTYPE).reshape((-1, 2))
+    return np.stack([swaps[:, 0] // N_j, swaps[:, 0] % N_j, swaps[:, 1] // N_j, swaps[:, 1] % N_j], axis=1)
+
+def _ordering_matrix(ordering: typing.List[int], N_i: int, N_j: int) -> np.ndarray:
+    # Rebuilds the ordering matrix of shape (N_i, N_j, 2), as the States hold it, from the flat indices:
+    flat = np.asarray(ordering, dtype=INDEX_DTYPE).reshape((N_i, N_j))
+    return np.stack([flat // N_j, flat % N_j], axis=-1)
+
+@instrumented('solver')
+def naive_method(
+    initial_colouring: np.ndarray, 
+    final_ordering: np.ndarray,
+) -> SwapLog:
+
+    swaps = naive_swaps(final_ordering, initial_colouring)
 
-            else:
-                logger.debug(f'Processed tile {(i, j)}: Fixed tile, nothing to do.')
+    # The states are only reconstructed from the swaps when they are needed:
+    states = SwapLog(initial_colouring, swaps)
 
     logger.info(f'Solver reschuffled tiles in {len(states)} steps.')
-    logger.debug(f'Swapping history: {[state.swapped_elements for state in states]}')
+    # The history is taken from the swaps directly, replaying the states would cost O(steps * tiles):
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug('Swapping history: %s', [[(i, j), (i_in, j_in)] for i, j, i_in, j_in in swaps.tolist()])
 
     return states
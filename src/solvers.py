@@ -0,0 +1,10 @@
+"""
+The solver methods by name, e.g. to choose from on the command line or per request to the server.
+"""
+from .solver_cycles import cycle_method
+from .solver_naive import naive_method
+
+SOLVERS = {
+    'naive': naive_method,
+    'cycles': cycle_method,
+}
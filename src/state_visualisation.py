@@ -1,11 +1,18 @@
 """
 Module to visualise a state.
 """
+import io
+import json
 import logging
+import os
+import struct
 import numpy as np
-from typing import List, Tuple
+from typing import BinaryIO, Callable, Iterable, Iterator, List, Sequence, Tuple
+from PIL import GifImagePlugin as PILGifImagePlugin
 from PIL import Image as PILImage
 from PIL import ImageDraw as PILImageDraw
+from .image_manipulation import COLOUR_DTYPE, COORDINATE_DTYPE
+from .instrumentation import instrumented
 
 # Set up logging:
 console_handler = logging.StreamHandler()
@@ -16,17 +23,350 @@ logger.addHandler(console_handler)
 logger.propagate = False
 
 
-def generate_solution_gif(solution: 'Solution') -> None:
-    file_name = solution.image.file_name.split('/')[-1]
-    images = [_generate_state_image(step) for step in solution.steps]
-    images[0].save(
-        f'solutions/{file_name}.gif', 
-        save_all=True,
-        optimize=False, 
-        append_images=images[1:], 
-        loop=0,
-        duration=len(images),
-    )
+def generate_solution_gif(solution: 'Solution', output_format: str = 'gif', output_dir: str = 'solutions') -> None:
+    """
+    Writes the solution to output_dir in one of the OUTPUT_FORMATS, with a file name
+    corresponding to the input file name and the format's extension.
+    The directory is created if it does not exist yet.
+    """
+    extension, _ = _output_format(output_format)
+    file_name = os.path.basename(str(solution.image.file_name))
+    os.makedirs(output_dir, exist_ok=True)
+    with open(os.path.join(output_dir, f'{file_name}.{extension}'), 'wb') as fp:
+        write_solution(solution.steps, fp, output_format=output_format)
+
+@instrumented('write_output')
+def write_solution(states: Sequence['State'], fp: BinaryIO, output_format: str = 'gif', **kwargs) -> None:
+    """
+    Writes the states to the binary stream fp in one of the OUTPUT_FORMATS, with one ms per frame and step
+    as in generate_solution_gif, unless a duration is given. Further options go to the format's writer.
+    """
+    _, writer = _output_format(output_format)
+    writer(states, fp, **{'duration': len(states), **kwargs})
+
+def solution_to_bytes(states: Sequence['State'], output_format: str = 'gif', **kwargs) -> bytes:
+    """
+    Returns the states in one of the OUTPUT_FORMATS as bytes, without touching the disk, see write_solution.
+    """
+    fp = io.BytesIO()
+    write_solution(states, fp, output_format=output_format, **kwargs)
+    return fp.getvalue()
+
+def _output_format(output_format: str) -> Tuple[str, Callable]:
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f'Unknown output format {output_format}, choose from {sorted(OUTPUT_FORMATS)}.')
+    return OUTPUT_FORMATS[output_format]
+
+def write_solution_gif(
+    states: Iterable['State'],
+    fp: BinaryIO,
+    duration: int = 100,
+    cell_size: int = 60,
+    loop: int = 0,
+) -> None:
+    """
+    Renders the states one after the other and writes them to the binary stream fp as
+    animated gif. Nothing but the current frame is held in memory, see StateRenderer.
+    The result looks the same as saving all images from _generate_state_image at once.
+    """
+    renderer = StateRenderer(cell_size=cell_size)
+    writer = StreamingGifWriter(fp, duration=duration, loop=loop)
+
+    for state in _animation_states(states):
+        frame = renderer.render(state)
+        writer.write_frame(PILImage.fromarray(frame), box=renderer.dirty_box)
+
+    writer.close()
+
+
+def write_solution_webp(
+    states: Iterable['State'],
+    fp: BinaryIO,
+    duration: int = 100,
+    cell_size: int = 60,
+    loop: int = 0,
+) -> None:
+    """
+    Writes the states as lossless animated WebP. Pillow needs all frames at once for this.
+    """
+    _save_animation(states, fp, 'WEBP', duration=duration, cell_size=cell_size, loop=loop, lossless=True)
+
+def write_solution_apng(
+    states: Iterable['State'],
+    fp: BinaryIO,
+    duration: int = 100,
+    cell_size: int = 60,
+    loop: int = 0,
+) -> None:
+    """
+    Writes the states as animated PNG. Pillow needs all frames at once for this.
+    """
+    _save_animation(states, fp, 'PNG', duration=duration, cell_size=cell_size, loop=loop)
+
+def _save_animation(states: Iterable['State'], fp: BinaryIO, pil_format: str, cell_size: int, **kwargs) -> None:
+    renderer = StateRenderer(cell_size=cell_size)
+    frames = [renderer.render_image(state) for state in _animation_states(states)]
+    frames[0].save(fp, format=pil_format, save_all=True, append_images=frames[1:], **kwargs)
+
+def _animation_states(states: Iterable['State']) -> Iterator['State']:
+    # Yields the states to render. An already solved puzzle has no steps, its animation is then the
+    # single frame of the initial state. Raises a ValueError if there is nothing to render at all.
+    if hasattr(states, 'initial_state') and len(states) == 0:
+        yield states.initial_state()
+        return
+
+    empty = True
+    for state in states:
+        empty = False
+        yield state
+
+    if empty:
+        raise ValueError('No states given, so there is nothing to render.')
+
+def write_solution_json(
+    states: Iterable['State'],
+    fp: BinaryIO,
+    duration: int = 100,
+    **kwargs,
+) -> None:
+    """
+    Writes the solution as move list for clients which render the states themselves:
+    A JSON-object with the tiling, the initial colouring as nested list of shape (N_i, N_j, 3),
+    the swaps as list of [i, j, i_in, j_in] and the frame duration in ms.
+    Rendering-options like the cell size are ignored.
+    """
+    initial_colouring, swaps = _initial_colouring_and_swaps(states)
+
+    fp.write(json.dumps({
+        'tiling': list(initial_colouring.shape[:2]),
+        'initial_colouring': initial_colouring.tolist(),
+        'swaps': swaps.tolist(),
+        'duration': duration,
+    }, separators=(',', ':')).encode())
+
+# Header of the binary move list: magic, version, bytes per coordinate, N_i, N_j, amount of swaps, duration.
+SWAPS_HEADER = struct.Struct('<4sBBHHII')
+SWAPS_MAGIC = b'HUES'
+SWAPS_VERSION = 1
+
+def write_solution_swaps(
+    states: Iterable['State'],
+    fp: BinaryIO,
+    duration: int = 100,
+    **kwargs,
+) -> None:
+    """
+    Writes the solution as binary move list, the most compact format for clients which render
+    the states themselves: The header SWAPS_HEADER, followed by the initial colouring as uint8 of
+    shape (N_i, N_j, 3) and the swaps of shape (n_steps, 4) as little-endian unsigned integers with
+    one or two bytes per coordinate. See read_solution_swaps.
+    Rendering-options like the cell size are ignored.
+    """
+    initial_colouring, swaps = _initial_colouring_and_swaps(states)
+
+    N_i, N_j, _ = initial_colouring.shape
+    coordinate_dtype = np.dtype('<u1') if max(N_i, N_j) <= 256 else np.dtype('<u2')
+
+    fp.write(SWAPS_HEADER.pack(SWAPS_MAGIC, SWAPS_VERSION, coordinate_dtype.itemsize, N_i, N_j, len(swaps), duration))
+    fp.write(initial_colouring.astype(COLOUR_DTYPE).tobytes())
+    fp.write(swaps.astype(coordinate_dtype).tobytes())
+
+def read_solution_swaps(fp: BinaryIO) -> Tuple[np.ndarray, np.ndarray, int]:
+    """
+    Reads a binary move list as written by write_solution_swaps and returns
+    the initial colouring, the swaps and the frame duration.
+    """
+    magic, version, coordinate_size, N_i, N_j, n_swaps, duration = SWAPS_HEADER.unpack(fp.read(SWAPS_HEADER.size))
+    if magic != SWAPS_MAGIC or version != SWAPS_VERSION:
+        raise ValueError(f'Not a move list of version {SWAPS_VERSION}: magic {magic}, version {version}.')
+
+    initial_colouring = np.frombuffer(fp.read(N_i * N_j * 3), dtype=COLOUR_DTYPE).reshape((N_i, N_j, 3))
+    coordinate_dtype = np.dtype(f'<u{coordinate_size}')
+    swaps = np.frombuffer(fp.read(n_swaps * 4 * coordinate_size), dtype=coordinate_dtype).reshape((n_swaps, 4))
+
+    return initial_colouring.copy(), swaps.astype(COORDINATE_DTYPE), duration
+
+def _initial_colouring_and_swaps(states: Iterable['State']) -> Tuple[np.ndarray, np.ndarray]:
+    # A SwapLog already holds exactly this, also for an already solved puzzle without any swaps.
+    # Otherwise we collect the swaps and undo the first one to get the colouring before it.
+    # Raises a ValueError if there are no states, as the initial colouring is unknown then.
+    if hasattr(states, 'initial_colouring') and hasattr(states, 'swaps'):
+        return np.asarray(states.initial_colouring), np.asarray(states.swaps).reshape((-1, 4))
+
+    initial_colouring, swaps = None, []
+    for state in states:
+        (i, j), (i_in, j_in) = state.swapped_elements
+        if initial_colouring is None:
+            initial_colouring = state.colouring.copy()
+            initial_colouring[[i, i_in], [j, j_in], :] = initial_colouring[[i_in, i], [j_in, j], :]
+        swaps.append((i, j, i_in, j_in))
+
+    if initial_colouring is None:
+        raise ValueError('No states given, so there is no initial colouring to write.')
+
+    return initial_colouring, np.asarray(swaps, dtype=COORDINATE_DTYPE).reshape((-1, 4))
+
+
+class StateRenderer(object):
+    """
+    Renders states into one frame buffer in PIL-orientation, i.e. of shape
+    (N_j * cell_size, N_i * cell_size, 3) and dtype uint8.
+    The first state is rendered completely, for all following ones we assume that they
+    differ from the previous one only in the swapped cells, so we only repaint these
+    and the cells under the previous swap-line, and then draw the new swap-line.
+    After each render, dirty_box holds the pixel-box (left, upper, right, lower) of the
+    region which changed (the whole frame for the first one).
+
+    :param cell_size: Size of each cell in pixels. The last pixel row and column of each cell are black.
+    :param add_swapped_element_line: Whether to draw a line between the swapped elements.
+    """
+    def __init__(self, cell_size: int = 60, add_swapped_element_line: bool = True) -> None:
+        super().__init__()
+        self.cell_size = cell_size
+        self.add_swapped_element_line = add_swapped_element_line
+        self.line_width = cell_size // 25
+        self.buffer = None
+        self.dirty_box = None
+        self._line_cells = None
+
+        # Pattern of one cell, which is 1 inside and 0 on the black separators:
+        self._cell_mask = np.ones((cell_size, cell_size, 1), dtype=np.uint8)
+        self._cell_mask[-1, :, :] = 0
+        self._cell_mask[:, -1, :] = 0
+
+    def render_full(self, state: 'State') -> np.ndarray:
+        """
+        Renders the complete state into a new frame buffer and returns it.
+        """
+        N_i, N_j, _ = state.colouring.shape
+        self.buffer = self._expand_cells(state.colouring)
+        self.dirty_box = (0, 0, N_i * self.cell_size, N_j * self.cell_size)
+        self._line_cells = None
+        self._draw_line(state)
+        return self.buffer
+
+    def render(self, state: 'State') -> np.ndarray:
+        """
+        Renders the state into the frame buffer and returns it. The buffer is reused,
+        so it is only valid until the next call.
+        """
+        if self.buffer is None or self.buffer.shape[:2] != self._frame_shape(state):
+            return self.render_full(state)
+
+        # Cells to repaint: The two swapped ones, and all below the previous line:
+        (i, j), (i_in, j_in) = state.swapped_elements
+        cell_boxes = [(i, i + 1, j, j + 1), (i_in, i_in + 1, j_in, j_in + 1)]
+        if self._line_cells is not None:
+            cell_boxes.append(self._line_cells)
+
+        for box in cell_boxes:
+            self._paint_cells(state.colouring, *box)
+
+        line_cells = self._draw_line(state)
+
+        # The dirty region covers everything we painted:
+        boxes = cell_boxes + ([line_cells] if line_cells is not None else [])
+        cs = self.cell_size
+        self.dirty_box = (
+            min(b[0] for b in boxes) * cs, min(b[2] for b in boxes) * cs,
+            max(b[1] for b in boxes) * cs, max(b[3] for b in boxes) * cs,
+        )
+
+        return self.buffer
+
+    def render_image(self, state: 'State') -> PILImage:
+        return PILImage.fromarray(self.render(state))
+
+    def _frame_shape(self, state: 'State') -> Tuple[int, int]:
+        N_i, N_j, _ = state.colouring.shape
+        return (N_j * self.cell_size, N_i * self.cell_size)
+
+    def _expand_cells(self, colouring: np.ndarray) -> np.ndarray:
+        # Expands a block of cell colours of shape (n_i, n_j, 3) to pixels, by repeating each colour
+        # over its cell and blacking out the separators.
+        n_i, n_j, _ = colouring.shape
+        cells = np.swapaxes(colouring, 0, 1).astype(np.uint8)
+        pixels = np.repeat(np.repeat(cells, self.cell_size, axis=0), self.cell_size, axis=1)
+        pixels *= np.tile(self._cell_mask, (n_j, n_i, 1))
+        return pixels
+
+    def _paint_cells(self, colouring: np.ndarray, i_0: int, i_1: int, j_0: int, j_1: int) -> None:
+        cs = self.cell_size
+        self.buffer[j_0*cs:j_1*cs, i_0*cs:i_1*cs, :] = self._expand_cells(colouring[i_0:i_1, j_0:j_1, :])
+
+    def _draw_line(self, state: 'State') -> Tuple[int, int, int, int]:
+        # Draws the swap-line into the buffer and returns the block of cells (i_0, i_1, j_0, j_1) it touches.
+        # We only hand the affected region to PIL and copy it back, instead of the whole frame.
+        if not self.add_swapped_element_line or state.swapped_elements is None:
+            self._line_cells = None
+            return None
+
+        cs = self.cell_size
+        x_0, y_0, x_1, y_1 = _line_coordinates(state, cs)
+        margin = self.line_width + 1
+        N_j_pixels, N_i_pixels = self.buffer.shape[:2]
+        i_0, i_1 = max((min(x_0, x_1) - margin) // cs, 0), min((max(x_0, x_1) + margin) // cs + 1, N_i_pixels // cs)
+        j_0, j_1 = max((min(y_0, y_1) - margin) // cs, 0), min((max(y_0, y_1) + margin) // cs + 1, N_j_pixels // cs)
+
+        region = PILImage.fromarray(self.buffer[j_0*cs:j_1*cs, i_0*cs:i_1*cs, :])
+        PILImageDraw.Draw(region).line(
+            (x_0 - i_0 * cs, y_0 - j_0 * cs, x_1 - i_0 * cs, y_1 - j_0 * cs),
+            fill=0,
+            width=self.line_width,
+        )
+        self.buffer[j_0*cs:j_1*cs, i_0*cs:i_1*cs, :] = np.asarray(region)
+
+        self._line_cells = (i_0, i_1, j_0, j_1)
+        return self._line_cells
+
+
+class StreamingGifWriter(object):
+    """
+    Writes an animated gif frame by frame, instead of collecting all frames first as
+    PIL's save(save_all=True) does. Each frame is quantised on its own and gets its own
+    colour table, which is what PIL does for RGB-frames as well. As with PIL, only the 
+    region which changed to the previous frame is written.
+    """
+    def __init__(self, fp: BinaryIO, duration: int = 100, loop: int = 0) -> None:
+        super().__init__()
+        self.fp = fp
+        self.duration = duration
+        self.loop = loop
+        self.n_frames = 0
+        self.previous = None
+
+    def write_frame(self, im: PILImage, box: Tuple[int, int, int, int] = None) -> None:
+        # If the caller knows which box (left, upper, right, lower) changed to the previous frame,
+        # we do not need to compare the frames.
+        pixels = np.asarray(im) if box is None else None
+
+        if self.n_frames == 0:
+            frame = im.convert('P', palette=PILImage.Palette.ADAPTIVE)
+            header, _ = PILGifImagePlugin.getheader(frame, info={'loop': self.loop, 'duration': self.duration})
+            for chunk in header:
+                self.fp.write(chunk)
+            offset = (0, 0)
+        elif box is not None:
+            frame = im.crop(box).convert('P', palette=PILImage.Palette.ADAPTIVE)
+            offset = box[:2]
+        else:
+            # Frames are drawn over the previous ones, so like PIL, we only write the part which changed:
+            changed = (pixels != self.previous).any(axis=2)
+            rows, columns = np.flatnonzero(changed.any(axis=1)), np.flatnonzero(changed.any(axis=0))
+            if len(rows) == 0:
+                rows, columns = np.zeros(1, dtype=int), np.zeros(1, dtype=int)
+            box = (columns[0], rows[0], columns[-1] + 1, rows[-1] + 1)
+            frame = im.crop(box).convert('P', palette=PILImage.Palette.ADAPTIVE)
+            offset = box[:2]
+
+        for chunk in PILGifImagePlugin.getdata(frame, offset, duration=self.duration, include_color_table=True):
+            self.fp.write(chunk)
+
+        self.previous = pixels if box is None else None
+        self.n_frames += 1
+
+    def close(self) -> None:
+        self.fp.write(b';')
 
 def _generate_state_image(
     state: 'State', 
@@ -35,25 +375,8 @@ def _generate_state_image(
     swapped_element_line_colour: int = 30,
     fixed_tiles_information: List[Tuple] = None,
 ) -> PILImage:
-    N_i, N_j, _ = state.colouring.shape
-    m = np.zeros((N_i * cell_size, N_j * cell_size, 3), dtype=int)
-
-    # Fill the colours in cell-wise:
-    for i in range(N_i):
-        for j in range(N_j):
-            m[i*cell_size:(i+1)*cell_size-1, j*cell_size:(j+1)*cell_size-1, :] = state.colouring[i, j, :]
-
-    im = PILImage.fromarray(np.uint8(np.swapaxes(m, 0, 1)))
-
-    if add_swapped_element_line:
-        draw = PILImageDraw.Draw(im)
-        draw.line(
-            _line_coordinates(state, cell_size), 
-            fill=0,
-            width=cell_size // 25,
-        )
-        
-    return im
+    renderer = StateRenderer(cell_size=cell_size, add_swapped_element_line=add_swapped_element_line)
+    return PILImage.fromarray(renderer.render_full(state))
 
 def _line_coordinates(state: 'State', cell_size: int):
     """
@@ -65,9 +388,19 @@ def _line_coordinates(state: 'State', cell_size: int):
 
     coord_set_for_drawing = (left_x, bottom_y, right_x, top_y)
 
-    logger.debug(f'Drawing a line for coordinates {coord_set_for_drawing} derived from swapped elements {state.swapped_elements}.')
+    logger.debug('Drawing a line for coordinates %s derived from swapped elements %s.', coord_set_for_drawing, state.swapped_elements)
 
     # Scale the return value to the actual image coordinates:
     return tuple(
         [a * cell_size + round(0.5 * cell_size) for a in coord_set_for_drawing]
     )
+
+
+# Output formats which can be chosen for generate_solution_gif, with their file extension and writer:
+OUTPUT_FORMATS = {
+    'gif': ('gif', write_solution_gif),
+    'webp': ('webp', write_solution_webp),
+    'apng': ('png', write_solution_apng),
+    'json': ('json', write_solution_json),
+    'swaps': ('swaps', write_solution_swaps),
+}
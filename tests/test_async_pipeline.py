@@ -0,0 +1,67 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from src.async_pipeline import run_pipeline
+
+# A deadlocked worker process would block the pipeline, and the interpreter on exit, forever.
+# The pipeline is thus run in a separate interpreter, which is killed after this many seconds:
+PIPELINE_TIMEOUT = 120
+
+PIPELINE_SCRIPT = '''
+import json, sys
+from src.async_pipeline import run_pipeline
+from src.solver_cycles import cycle_method
+files, kwargs = json.loads(sys.argv[1])
+print(json.dumps(run_pipeline(files, solver=cycle_method, **kwargs)))
+'''
+
+
+class TestAsyncPipeline(unittest.TestCase):
+
+    def run_pipeline_with_timeout(self, files, **kwargs):
+        try:
+            process = subprocess.run(
+                [sys.executable, '-c', PIPELINE_SCRIPT, json.dumps([files, kwargs])],
+                capture_output=True, text=True, timeout=PIPELINE_TIMEOUT,
+            )
+        except subprocess.TimeoutExpired:
+            self.fail(f'Pipeline did not finish within {PIPELINE_TIMEOUT} s.')
+
+        self.assertEqual(0, process.returncode, process.stderr)
+        return json.loads(process.stdout.splitlines()[-1])
+
+    def test_run_pipeline(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            broken = os.path.join(tmp_dir, 'broken.jpeg')
+            with open(broken, 'wb') as f:
+                f.write(b'this is not a jpeg')
+            files = ['images/test1.jpeg', broken, 'images/test2.jpeg']
+            output_dir = os.path.join(tmp_dir, 'solutions')
+
+            results = self.run_pipeline_with_timeout(
+                files, output_format='json', output_dir=output_dir,
+                decode_threads=2, solve_workers=2, write_threads=1, queue_size=1,
+            )
+
+            # Every file gets a result, the broken one does not stop the others:
+            self.assertEqual(sorted(files), sorted(r[0] for r in results))
+            success = {r[0]: r[1] for r in results}
+            self.assertEqual({'images/test1.jpeg': True, broken: False, 'images/test2.jpeg': True}, success)
+
+            for file_name in ('test1.jpeg', 'test2.jpeg'):
+                with open(os.path.join(output_dir, f'{file_name}.json')) as f:
+                    self.assertGreater(len(json.load(f)['swaps']), 0)
+
+    def test_draft(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            results = self.run_pipeline_with_timeout(
+                ['images/test1.jpeg'], output_format='json', output_dir=tmp_dir, solve_workers=1, draft=True,
+            )
+            self.assertTrue(results[0][1], results[0][2])
+
+    def test_unknown_format(self):
+        with self.assertRaises(ValueError):
+            run_pipeline(['images/test1.jpeg'], output_format='bmp')
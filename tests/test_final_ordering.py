@@ -1,3 +1,4 @@
+import itertools
 import unittest
 import numpy as np
 from src.final_ordering import (
@@ -6,15 +7,20 @@ from src.final_ordering import (
     _calculate_delta_to_reference_tiles,
     _extract_target_tile_coordinates,
     find_final_ordering,
+    find_final_ordering_by_assignment,
+    ColourIndex,
+    _linear_sum_assignment,
 )
 from src.image_manipulation import Image
+from src.solution_base import Solution
+from benchmarks.bench_final_ordering import synthetic_puzzle, accuracy
 
 
 class TestPuzzleSolver(unittest.TestCase):
 
     def setUp(self) -> None:
         self.image_path1 = 'images/test1.jpeg'
-        self.image_path2 = 'images/test2-jpeg'
+        self.image_path2 = 'images/test2.jpeg'
         return super().setUp()
 
     def test_fixed_tiles_mask(self):
@@ -128,3 +134,67 @@ class TestPuzzleSolver(unittest.TestCase):
 
         # Compare the ordering-matrices:
         self.assertTrue((target_ordering == final_ordering).all())
+
+    def test_colour_index(self):
+        # Lots of duplicate colours, such that the tie-breaking is tested as well:
+        colours = np.random.default_rng(0).integers(0, 4, (9, 7, 3)) * 60
+        mask = np.zeros((9, 7))
+        mask[0, :] = 1.0
+        index = ColourIndex(colours, excluded_mask=mask, leaf_size=4)
+
+        references = [colours[0, 0], colours[0, 3]]
+        for _ in range(9 * 7 - 7):
+            deltas = _calculate_delta_to_reference_tiles([(0, 0), (0, 3)], colours)
+            expected = _extract_target_tile_coordinates(deltas, mask)
+
+            self.assertEqual(expected, index.closest(references))
+
+            index.remove(*expected)
+            mask[expected] = 1.0
+
+    def test_find_final_ordering_engines_agree(self):
+        image = Image(self.image_path2)
+        puzzles = [image, synthetic_puzzle(12, 9, seed=1), synthetic_puzzle(20, 20, seed=2)]
+
+        for puzzle in puzzles:
+            bruteforce_ordering, bruteforce_colouring = find_final_ordering(puzzle, engine='bruteforce')
+            kdtree_ordering, kdtree_colouring = find_final_ordering(puzzle, engine='kdtree')
+
+            self.assertTrue((bruteforce_ordering == kdtree_ordering).all())
+            self.assertTrue((bruteforce_colouring == kdtree_colouring).all())
+
+        with self.assertRaises(ValueError):
+            find_final_ordering(image, engine='unknown')
+
+    def test_linear_sum_assignment(self):
+        # Compare against trying out all permutations, with lots of ties in the costs:
+        rng = np.random.default_rng(0)
+        for n in [1, 2, 4, 6]:
+            for _ in range(10):
+                cost = rng.integers(0, 5, (n, n)).astype(float)
+                assignment = _linear_sum_assignment(cost)
+                best = min(cost[np.arange(n), list(p)].sum() for p in itertools.permutations(range(n)))
+
+                self.assertEqual(list(range(n)), sorted(assignment.tolist()))
+                self.assertAlmostEqual(best, cost[np.arange(n), assignment].sum())
+
+    def test_find_final_ordering_by_assignment(self):
+        # Without noise, the bilinear gradient is recovered completely, no matter where the fixed tiles are:
+        for fixed in ['border', 'corners']:
+            puzzle = synthetic_puzzle(9, 12, seed=3, fixed=fixed)
+            final_ordering, final_colouring = find_final_ordering_by_assignment(puzzle)
+
+            self.assertEqual((1.0, 0.0), accuracy(puzzle, final_ordering))
+            self.assertTrue((puzzle.target_colours == final_colouring).all())
+
+        # Fixed tiles stay where they are:
+        for i, j in puzzle.fixed_tiles:
+            self.assertEqual([i, j], final_ordering[i, j].tolist())
+
+    def test_solution_ordering_method(self):
+        image = Image(self.image_path2)
+        solution = Solution(image, ordering_method='assignment')
+        self.assertTrue(solution.final_state.is_sane())
+
+        with self.assertRaises(ValueError):
+            Solution(image, ordering_method='unknown')
@@ -1,6 +1,11 @@
 import unittest
 import numpy as np
-from src.fourier_analysis import get_major_frequencies_from_matrix, _get_major_frequency_from_array
+from src.fourier_analysis import (
+    get_major_frequencies_from_matrix,
+    get_major_frequencies_batched,
+    vote,
+    _get_major_frequency_from_array,
+)
 
 
 class TestFourierAnalysis(unittest.TestCase):
@@ -33,3 +38,23 @@ class TestFourierAnalysis(unittest.TestCase):
         frequencies = get_major_frequencies_from_matrix(self.matrix)
         self.assertAlmostEqual(5.0, frequencies[0])
         self.assertAlmostEqual(3.0, frequencies[1])
+
+    def test_scanlines_fourier_analysis(self):
+        # Most scanlines show the peaks, one is a sinusoid and one is just flat:
+        t = np.linspace(0, 1, 100)
+        signals = np.stack([self.peaks, self.peaks, np.sin(2 * np.pi * 3 * t), np.zeros(100), self.peaks])
+        self.assertAlmostEqual(5.0, vote(get_major_frequencies_batched(list(signals))))
+
+        # On a tie, the lower frequency wins:
+        self.assertAlmostEqual(3.0, vote(get_major_frequencies_batched(list(signals[1:3]))))
+
+    def test_batched_fourier_analysis(self):
+        # Signals of different lengths have to give the same results as one at a time:
+        signals = [self.sinusoid, self.peaks, self.matrix[:, 33], self.sinusoid[:-10], self.peaks[::-1]]
+        for ignore_constant in [True, False]:
+            self.assertEqual(
+                [_get_major_frequency_from_array(s, ignore_constant=ignore_constant) for s in signals],
+                get_major_frequencies_batched(signals, ignore_constant=ignore_constant).tolist()
+            )
+
+        self.assertEqual((0,), get_major_frequencies_batched([]).shape)
@@ -1,6 +1,30 @@
+import glob
+import io
+import json
+import os
+import tempfile
 import unittest
+from unittest import mock
 import numpy as np
-from src.image_manipulation import PILImage, Image, get_background_pixels, get_background_pixels, is_single_colour
+from src.image_manipulation import (
+    PILImage,
+    Image,
+    get_background_pixels,
+    get_background_pixels,
+    is_single_colour,
+    colour_distances,
+    get_majority_colour,
+    get_majority_colours_per_tile,
+    get_dotted_tiles,
+    cut_array_to_size,
+    count_tiling_from_scanlines,
+    count_tilings_from_scanlines,
+    pack_colours,
+    unpack_colours,
+)
+from src.solution_base import Solution
+from src.solver_naive import naive_method
+from benchmarks.puzzle_generator import generate_puzzle
 
 
 class TestImageManipulation(unittest.TestCase):
@@ -14,6 +38,28 @@ class TestImageManipulation(unittest.TestCase):
         self.assertIsNotNone(Image(self.image_path))
         self.assertIsNotNone(Image.load_image(self.image_path))
 
+    def test_lazy_stages(self):
+        # Nothing should be computed on construction, and asking for the tiling should not
+        # trigger the detection of the dots or the colour extraction:
+        image = Image(self.image_path)
+        self.assertEqual([], image.computed_stages)
+
+        tiling = image.tiling
+        self.assertEqual(['pixels', 'tiling'], image.computed_stages)
+
+        # Stages are cached:
+        self.assertIs(tiling, image.tiling)
+
+        image.tile_colours
+        self.assertEqual(['pixels', 'tiling', 'tile_colours'], image.computed_stages)
+
+        # Stages can be overwritten, and the PIL-image and the buffer are kept in sync.
+        # All stages depending on the pixels are dropped with them:
+        image.image = PILImage.fromarray(np.zeros((20, 10, 3), dtype=np.uint8))
+        self.assertEqual(['pixels'], image.computed_stages)
+        self.assertEqual((20, 10, 3), image.pixels.shape)
+        self.assertEqual((10, 20), image.image.size)
+
     def test_cut_to_size(self):
         image = PILImage.open(self.image_path)
         image_cut_to_size = Image.cut_to_size(image)
@@ -21,6 +67,30 @@ class TestImageManipulation(unittest.TestCase):
         for k, size in enumerate(image.size):
             self.assertGreaterEqual(size, image_cut_to_size.size[k])
 
+    def test_cut_array_to_size(self):
+        def cut_with_is_single_colour(pix):
+            # Reference: Remove the rows of each background colour one after the other.
+            for pixel in get_background_pixels(pix):
+                pix = pix[~is_single_colour(pix, target_colour=pixel, majority_vote_threshold=0.95), :, :]
+            return pix
+
+        pix = np.asarray(PILImage.open(self.image_path))
+        cut = cut_array_to_size(pix, chunk_rows=100)
+
+        self.assertTrue((cut_with_is_single_colour(pix) == cut).all())
+
+        # The tiles are one band in the screenshot, so we should not have copied anything:
+        self.assertTrue(np.shares_memory(cut, pix))
+
+        # A background row in the middle of the image is cut away as well, then we need a copy:
+        synthetic = np.full((10, 20, 3), 200, dtype=np.uint8)
+        synthetic[[0, 1, 5], :, :] = 0
+        synthetic[[8, 9], :, :] = [30, 20, 30]
+        synthetic[3, :10, :] = 0
+
+        self.assertTrue((cut_with_is_single_colour(synthetic) == cut_array_to_size(synthetic, chunk_rows=3)).all())
+        self.assertEqual((5, 20, 3), cut_array_to_size(synthetic).shape)
+
     def test_get_background_pixel(self):
         # Let's test this with an established picture right away.
         # Alternatively, you can set up a synthetic test at some point.
@@ -119,6 +189,27 @@ class TestImageManipulation(unittest.TestCase):
             Image.count_tiling(image2.image)
         )
 
+    def test_count_tiling_from_scanlines(self):
+        # The fast detection has to find the correct tiling on all images we have,
+        # also when they come in at a higher resolution:
+        known_tilings = {'images/test1.jpeg': [8, 10], 'images/test2.jpeg': [9, 11]}
+
+        for file_name in glob.glob('images/*.jpeg'):
+            image = Image(file_name)
+            self.assertEqual(known_tilings[file_name], count_tiling_from_scanlines(image.pixels))
+            self.assertEqual(known_tilings[file_name], image.tiling)
+
+            upscaled = image.image.resize((2 * image.image.size[0], 2 * image.image.size[1]))
+            self.assertEqual(known_tilings[file_name], Image.count_tiling(upscaled))
+
+        # All images at once, in different resolutions:
+        arrays = [Image(file_name).pixels for file_name in sorted(known_tilings)]
+        arrays.append(np.asarray(PILImage.fromarray(arrays[0]).resize((1080, 1675))))
+        self.assertEqual(
+            [known_tilings[file_name] for file_name in sorted(known_tilings)] + [known_tilings['images/test1.jpeg']],
+            count_tilings_from_scanlines(arrays)
+        )
+
     def test_get_fixed_tile_positions(self):
         image = Image(self.image_path)
 
@@ -148,10 +239,153 @@ class TestImageManipulation(unittest.TestCase):
             # Number-wise it means that the next element along a row has lower
             # colour-channel values, so the difference of element k to k-1 is overall negative.
             for k in range(1, im.tiling[0]):
-                colour_diff = im.tile_colours[k, row] - im.tile_colours[k - 1, row]
+                colour_diff = im.tile_colours[k, row].astype(int) - im.tile_colours[k - 1, row]
                 return colour_diff.sum() < 0
 
         self.assertTrue(test_ascending_tiling(image, row=0))
         self.assertTrue(test_ascending_tiling(image, row=-1))
         self.assertTrue(test_ascending_tiling(image2, row=0))
         self.assertTrue(test_ascending_tiling(image2, row=-1))
+
+    def test_pack_colours(self):
+        colours = np.asarray([[0, 0, 0], [255, 255, 255], [1, 2, 3], [3, 2, 1]])
+        keys = pack_colours(colours)
+
+        self.assertEqual([0, 0xFFFFFF, 0x010203, 0x030201], keys.tolist())
+        self.assertTrue((colours == unpack_colours(keys)).all())
+
+    def test_colour_distances(self):
+        # In uint8, the distances have to be the same as with the upcast to int, without wrapping around:
+        pixels = np.random.default_rng(0).integers(0, 256, size=(50, 40, 3)).astype(np.uint8)
+        for colour in [np.asarray([0, 0, 0]), np.asarray([255, 128, 3], dtype=np.uint8), pixels[3, 7]]:
+            expected = np.abs(pixels.astype(int) - colour.astype(int)).sum(axis=2)
+            self.assertEqual(expected.tolist(), colour_distances(pixels, colour).tolist())
+            self.assertEqual(expected.tolist(), colour_distances(pixels.astype(int), colour).tolist())
+
+    def test_compact_dtypes(self):
+        solution = Solution(Image(self.image_path))
+        solution.solve(naive_method)
+
+        self.assertEqual(np.uint8, solution.image.tile_colours.dtype)
+        self.assertEqual(np.uint8, solution.final_colouring.dtype)
+        self.assertEqual(np.int16, solution.final_ordering.dtype)
+        self.assertEqual(np.int16, solution.steps.swaps.dtype)
+
+    def test_majority_colours_per_tile(self):
+        # The vectorised version has to give exactly the same results as cropping every tile
+        # and calling get_majority_colour on it, also for tilings which do not divide the image evenly:
+        image = Image(self.image_path)
+
+        for tiling in [[8, 10], [7, 13]]:
+            image.tiling = tiling
+            expected = np.asarray([
+                [get_majority_colour(image.get_tile(i, j)) for j in range(tiling[1])]
+                for i in range(tiling[0])
+            ])
+            self.assertTrue((expected == get_majority_colours_per_tile(np.asarray(image.image), tiling)).all())
+
+    def test_majority_colours_per_tile_tie_breaking(self):
+        # In a tie, the lexicographically smallest colour wins, as with np.unique in get_majority_colour:
+        pix = np.zeros((2, 4, 3), dtype=np.uint8)
+        pix[:, 0, :] = [10, 0, 0]
+        pix[:, 1, :] = [0, 0, 200]
+        pix[:, 2:, :] = 50
+        pix[0, 3, :] = 60
+
+        majority_colours = get_majority_colours_per_tile(pix, [2, 1])
+
+        self.assertEqual([0, 0, 200], majority_colours[0, 0].tolist())
+        self.assertEqual([50, 50, 50], majority_colours[1, 0].tolist())
+        self.assertEqual(get_majority_colour(PILImage.fromarray(pix[:, :2])).tolist(), majority_colours[0, 0].tolist())
+
+    def test_dotted_tiles(self):
+        # The grid-level detector has to give the same list, in the same order, as checking every tile
+        # with tile_has_dot, also on noisy images with an uneven tiling:
+        image = Image(self.image_path)
+        noise = np.random.default_rng(0).integers(0, 6, (300, 200, 3), dtype=np.uint8) * 40
+
+        for pix, tiling in [(np.asarray(image.image), [8, 10]), (np.asarray(image.image), [7, 13]), (noise, [7, 9])]:
+            # Setting the image drops the previous tiling, we set the one to test against:
+            image.image = PILImage.fromarray(pix)
+            image.tiling = tiling
+            expected = [
+                (i, j) for j in range(tiling[1]) for i in range(tiling[0]) if Image.tile_has_dot(image.get_tile(i, j))
+            ]
+            self.assertEqual(expected, get_dotted_tiles(pix, tiling))
+
+    def test_synthetic_puzzle(self):
+        # The pipeline has to find in a generated screenshot exactly what was put into it,
+        # also after passing it through JPEG:
+        for jpeg_quality in (None, 90):
+            puzzle = generate_puzzle(7, 9, fixed='corners', jpeg_quality=jpeg_quality)
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                file_name = os.path.join(tmp_dir, 'puzzle.png')
+                puzzle.image.save(file_name)
+                image = Image(file_name)
+
+                self.assertEqual(puzzle.tiling, list(image.tiling))
+                self.assertEqual([tuple(t) for t in puzzle.fixed_tiles], [tuple(t) for t in image.fixed_tiles])
+                self.assertLessEqual(np.abs(np.asarray(image.tile_colours, dtype=int) - puzzle.tile_colours).max(), 2)
+
+    def test_in_memory_sources(self):
+        # Bytes, buffers and arrays have to give the same pixels as loading the file:
+        expected = Image(self.image_path).pixels
+        with open(self.image_path, 'rb') as f:
+            data = f.read()
+
+        with open(self.image_path, 'rb') as f:
+            from_buffer = Image.from_buffer(f)
+        # The buffer is read right away, so it may be closed before the pixels are needed:
+        self.assertEqual(self.image_path, from_buffer.file_name)
+
+        for image in (
+            Image.from_bytes(data),
+            from_buffer,
+            Image.from_buffer(io.BytesIO(data), name='upload'),
+            Image.from_array(np.asarray(PILImage.open(self.image_path))),
+            Image.from_array(expected, cut=False),
+        ):
+            self.assertTrue((expected == image.pixels).all())
+        self.assertEqual('upload', Image.from_buffer(io.BytesIO(data), name='upload').file_name)
+
+    def test_solve_without_file_system(self):
+        with open(self.image_path, 'rb') as f:
+            data = f.read()
+
+        with mock.patch('builtins.open', side_effect=AssertionError('no file access')), \
+                mock.patch('os.makedirs', side_effect=AssertionError('no file access')):
+            solution = Solution(Image.from_bytes(data, name='upload'))
+            solution.solve(naive_method)
+            gif = solution.to_bytes()
+            fp = io.BytesIO()
+            solution.write(fp, output_format='json')
+
+        self.assertEqual(len(solution.steps), PILImage.open(io.BytesIO(gif)).n_frames)
+        self.assertEqual(solution.steps.swaps.tolist(), json.loads(fp.getvalue())['swaps'])
+
+    def test_draft_mode(self):
+        # Decoding at reduced resolution has to give the same analysis as the full decode,
+        # on the screenshots as well as on synthetic ones with small and large tiles:
+        sources = []
+        for image_path in (self.image_path, self.image_path2):
+            with open(image_path, 'rb') as f:
+                sources.append((f.read(), 2))
+        for N_i, N_j, tile_width, tile_height, scale in [(5, 6, 200, 250, 4), (6, 8, 330, 400, 8), (12, 16, 60, 75, 1)]:
+            puzzle = generate_puzzle(N_i, N_j, fixed='corners', tile_width=tile_width, tile_height=tile_height)
+            fp = io.BytesIO()
+            puzzle.image.save(fp, format='JPEG', quality=90)
+            sources.append((fp.getvalue(), scale))
+
+        for data, scale in sources:
+            full, draft = Image.from_bytes(data), Image.from_bytes(data, draft=True)
+            self.assertEqual(full.tiling, draft.tiling)
+            self.assertEqual(scale, draft.draft_scale)
+            self.assertEqual(full.fixed_tiles, draft.fixed_tiles)
+            self.assertTrue((full.tile_colours == draft.tile_colours).all())
+
+        # Other formats are decoded as they are:
+        fp = io.BytesIO()
+        PILImage.open(self.image_path).save(fp, format='PNG')
+        draft = Image.from_bytes(fp.getvalue(), draft=True)
+        self.assertEqual(1, draft.draft_scale)
+        self.assertEqual(Image(self.image_path).pixels.shape, draft.pixels.shape)
@@ -0,0 +1,73 @@
+import json
+import unittest
+import numpy as np
+from src import instrumentation
+from src.image_manipulation import Image
+from src.solution_base import Solution
+from src.solver_naive import naive_method
+
+
+class TestInstrumentation(unittest.TestCase):
+
+    def tearDown(self) -> None:
+        instrumentation.disable()
+        return super().tearDown()
+
+    def test_disabled_records_nothing(self):
+        records = []
+        with instrumentation.collect(records):
+            with instrumentation.stage('a'):
+                pass
+            self.assertEqual(3, instrumentation.instrumented('b')(lambda x: x + 1)(2))
+        self.assertEqual([], records)
+
+    def test_stages_and_sinks(self):
+        instrumentation.enable()
+        records, sunk = [], []
+        instrumentation.add_sink(sunk.append)
+
+        @instrumentation.instrumented('outer')
+        def outer():
+            with instrumentation.stage('inner'):
+                return sum(range(1000))
+
+        with instrumentation.collect(records):
+            self.assertEqual(sum(range(1000)), outer())
+        instrumentation.remove_sink(sunk.append)
+        outer()
+
+        # Nested stages finish first, and the collector is gone after its context:
+        self.assertEqual(['inner', 'outer'], [r.stage for r in records])
+        self.assertEqual(records, sunk)
+        self.assertTrue(all(r.wall_time >= 0 and r.cpu_time >= 0 and r.peak_memory is None for r in records))
+        self.assertGreaterEqual(records[1].wall_time, records[0].wall_time)
+
+    def test_trace_memory(self):
+        instrumentation.enable(trace_memory=True)
+        records = []
+        with instrumentation.collect(records):
+            with instrumentation.stage('outer'):
+                with instrumentation.stage('inner'):
+                    a = np.ones(10 ** 6)
+                    del a
+                b = np.ones(10 ** 5)
+
+        # The outer stage has to see the peak of the inner one, even though it was reset in there:
+        inner, outer = records
+        self.assertGreaterEqual(inner.peak_memory, 8 * 10 ** 6)
+        self.assertGreaterEqual(outer.peak_memory, inner.peak_memory)
+
+    def test_solution_metrics(self):
+        instrumentation.enable()
+        solution = Solution(Image('images/test1.jpeg'))
+        solution.solve(naive_method)
+
+        stages = [r.stage for r in solution.stage_metrics]
+        self.assertEqual(
+            ['load_image', 'cut_to_size', 'count_tiling', 'fixed_tiles', 'tile_colours', 'final_ordering', 'sanity_check', 'solver'],
+            stages,
+        )
+
+        line = json.loads(instrumentation.format_metrics(solution.stage_metrics, file_name='images/test1.jpeg'))
+        self.assertEqual('images/test1.jpeg', line['file_name'])
+        self.assertEqual(stages, [s['stage'] for s in line['stages']])
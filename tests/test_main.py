@@ -0,0 +1,62 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+from main import collect_files, run_batch, solve_file, parse_args
+
+
+def _dying_worker(file_name, *args):
+    # Stands in for solve_file in a worker process which gets killed, e.g. for running out of memory:
+    os._exit(1)
+
+
+class TestMain(unittest.TestCase):
+
+    def test_collect_files(self):
+        # A directory should be expanded to all jpegs in there:
+        self.assertEqual(['images/test1.jpeg', 'images/test2.jpeg'], collect_files(['images']))
+
+        # Globs and plain files should work as well, without producing duplicates:
+        self.assertEqual(
+            ['images/test1.jpeg', 'images/test2.jpeg'],
+            collect_files(['images/test*.jpeg', 'images/test1.jpeg'])
+        )
+
+        # Only one file should be returned if we only want the latest one:
+        self.assertEqual(1, len(collect_files(['images'], latest=True)))
+
+        self.assertEqual([], collect_files(['does/not/exist/*.jpeg']))
+
+    def test_solve_file_does_not_raise_on_broken_input(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_name = os.path.join(tmp_dir, 'broken.jpeg')
+            with open(file_name, 'wb') as f:
+                f.write(b'this is not a jpeg')
+
+            returned_file_name, success, message, elapsed = solve_file(file_name)
+
+        self.assertEqual(file_name, returned_file_name)
+        self.assertFalse(success)
+        self.assertTrue(len(message) > 0)
+        self.assertGreaterEqual(elapsed, 0.0)
+
+    def test_run_batch_survives_dead_worker(self):
+        files = ['images/test1.jpeg', 'images/test2.jpeg']
+        with mock.patch('main.solve_file', _dying_worker):
+            results = run_batch(files, workers=1)
+
+        self.assertEqual(sorted(files), sorted(r[0] for r in results))
+        self.assertTrue(all(not r[1] and 'BrokenProcessPool' in r[2] for r in results))
+
+    def test_parse_args(self):
+        args = parse_args([])
+        self.assertEqual(['images'], args.targets)
+        self.assertFalse(args.latest)
+        self.assertIsNone(args.workers)
+        self.assertEqual('gif', args.format)
+
+        args = parse_args(['some/dir', '--latest', '--workers', '3', '--format', 'swaps'])
+        self.assertEqual(['some/dir'], args.targets)
+        self.assertTrue(args.latest)
+        self.assertEqual(3, args.workers)
+        self.assertEqual('swaps', args.format)
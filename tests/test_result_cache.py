@@ -0,0 +1,106 @@
+import os
+import tempfile
+import time
+import unittest
+import numpy as np
+from src import image_manipulation
+from src.image_manipulation import Image
+from src.result_cache import ResultCache
+from src.solution_base import Solution
+from src.solver_naive import naive_method
+
+
+class TestResultCache(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache = ResultCache(self.tmp_dir.name, max_entries=2)
+        self.pixels = np.arange(60, dtype=np.uint8).reshape((5, 4, 3))
+        return super().setUp()
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+        return super().tearDown()
+
+    def test_key(self):
+        key = ResultCache.key(self.pixels)
+        self.assertEqual(key, ResultCache.key(self.pixels.copy()))
+
+        # Different content or shape has to give a different key:
+        changed = self.pixels.copy()
+        changed[0, 0, 0] = 255
+        self.assertNotEqual(key, ResultCache.key(changed))
+        self.assertNotEqual(key, ResultCache.key(self.pixels.reshape((4, 5, 3))))
+
+        # As do further settings:
+        self.assertNotEqual(ResultCache.key(self.pixels, 'greedy'), ResultCache.key(self.pixels, 'assignment'))
+
+    def test_key_changes_with_thresholds(self):
+        key = ResultCache.key(self.pixels)
+        original_threshold = image_manipulation.DOT_COLOUR_DISTANCE_THRESHOLD
+        try:
+            image_manipulation.DOT_COLOUR_DISTANCE_THRESHOLD = original_threshold + 1
+            self.assertNotEqual(key, ResultCache.key(self.pixels))
+        finally:
+            image_manipulation.DOT_COLOUR_DISTANCE_THRESHOLD = original_threshold
+
+        self.assertEqual(key, ResultCache.key(self.pixels))
+
+    def test_put_get_and_merge(self):
+        self.assertIsNone(self.cache.get('a'))
+
+        self.cache.put('a', {'x': np.arange(3)})
+        self.cache.put('a', {'y': np.ones((2, 2))})
+        entry = self.cache.get('a')
+
+        self.assertEqual({'x', 'y'}, set(entry.keys()))
+        self.assertEqual([0, 1, 2], entry['x'].tolist())
+
+    def test_unreadable_entry(self):
+        # A truncated entry counts as miss and is removed, such that it gets written anew:
+        self.cache.put('a', {'x': np.arange(1000)})
+        path = os.path.join(self.tmp_dir.name, 'a.npz')
+        with open(path, 'rb') as f:
+            data = f.read()
+        for truncated in (data[:len(data) // 2], data[:10], b''):
+            with open(path, 'wb') as f:
+                f.write(truncated)
+            self.assertIsNone(self.cache.get('a'))
+            self.assertFalse(os.path.exists(path))
+
+        self.cache.put('a', {'x': np.arange(3)})
+        self.assertEqual([0, 1, 2], self.cache.get('a')['x'].tolist())
+
+    def test_lru_eviction(self):
+        self.cache.put('a', {'x': np.arange(1)})
+        self.cache.put('b', {'x': np.arange(2)})
+
+        # Mark a as used, such that b is the least recently used:
+        os.utime(self.cache._path('b'), (time.time() - 100, time.time() - 100))
+        self.cache.get('a')
+
+        self.cache.put('c', {'x': np.arange(3)})
+
+        self.assertEqual(2, len(self.cache))
+        self.assertIsNotNone(self.cache.get('a'))
+        self.assertIsNone(self.cache.get('b'))
+        self.assertIsNotNone(self.cache.get('c'))
+
+    def test_solution_uses_cache(self):
+        solution = Solution(Image('images/test2.jpeg'), cache=self.cache)
+        solution.solve(naive_method)
+
+        # A second run on the same screenshot should not need to analyse the image anymore:
+        image = Image('images/test2.jpeg')
+        cached_solution = Solution(image, cache=self.cache)
+        self.assertEqual(['pixels', 'tiling', 'fixed_tiles', 'tile_colours'], image.computed_stages)
+        cached_solution.solve(naive_method)
+
+        self.assertEqual(solution.image.tiling, image.tiling)
+        self.assertEqual(solution.image.fixed_tiles, image.fixed_tiles)
+        self.assertTrue((solution.final_ordering == cached_solution.final_ordering).all())
+        self.assertEqual(len(solution.steps), len(cached_solution.steps))
+        for step, cached_step in zip(solution.steps, cached_solution.steps):
+            self.assertEqual(step.swapped_elements, cached_step.swapped_elements)
+            self.assertTrue((step.colouring == cached_step.colouring).all())
+            self.assertTrue((step.ordering == cached_step.ordering).all())
@@ -0,0 +1,105 @@
+import io
+import json
+import os
+import threading
+import unittest
+from http.client import HTTPConnection
+from server import SolveServer, parse_args
+from src.state_visualisation import read_solution_swaps
+
+
+class TestServer(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.server = SolveServer(('127.0.0.1', 0), workers=1, queue_size=1)
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+        with open('images/test1.jpeg', 'rb') as f:
+            cls.screenshot = f.read()
+        return super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.server.shutdown()
+        cls.server.server_close()
+        return super().tearDownClass()
+
+    def request(self, method: str, path: str, body: bytes = None):
+        connection = HTTPConnection(*self.server.server_address, timeout=60)
+        connection.request(method, path, body=body)
+        response = connection.getresponse()
+        result = response.status, dict(response.getheaders()), response.read()
+        connection.close()
+        return result
+
+    def test_health(self):
+        status, _, body = self.request('GET', '/health')
+        self.assertEqual(200, status)
+        self.assertEqual({'status': 'ok'}, json.loads(body))
+
+    def test_solve(self):
+        status, headers, body = self.request('POST', '/solve', self.screenshot)
+        self.assertEqual(200, status)
+        self.assertEqual('application/json', headers['Content-Type'])
+        solution = json.loads(body)
+        self.assertEqual(int(headers['X-Steps']), len(solution['swaps']))
+
+        # Other formats can be asked for per request:
+        status, headers, body = self.request('POST', '/solve?format=swaps&solver=cycles', self.screenshot)
+        self.assertEqual(200, status)
+        initial_colouring, swaps, _ = read_solution_swaps(io.BytesIO(body))
+        self.assertEqual(solution['initial_colouring'], initial_colouring.tolist())
+        self.assertLessEqual(len(swaps), len(solution['swaps']))
+
+        metrics = json.loads(self.request('GET', '/metrics')[2])
+        self.assertGreaterEqual(metrics['solved'], 2)
+        self.assertGreaterEqual(metrics['total_time']['max'], metrics['solve_time']['p50'])
+
+    def test_bad_requests(self):
+        self.assertEqual(404, self.request('GET', '/nothing')[0])
+        self.assertEqual(400, self.request('POST', '/solve?format=bmp', self.screenshot)[0])
+        self.assertEqual(400, self.request('POST', '/solve')[0])
+
+        status, _, body = self.request('POST', '/solve', b'this is not a jpeg')
+        self.assertEqual(422, status)
+        self.assertIn('error', json.loads(body))
+
+    def test_invalid_content_length(self):
+        connection = HTTPConnection(*self.server.server_address, timeout=60)
+        connection.putrequest('POST', '/solve')
+        connection.putheader('Content-Length', 'abc')
+        connection.endheaders()
+        response = connection.getresponse()
+        self.assertEqual(400, response.status)
+        self.assertIn('Content-Length', json.loads(response.read())['error'])
+        connection.close()
+
+    def test_backpressure(self):
+        # With the worker and the queue taken, further requests are rejected instead of queued:
+        for _ in range(2):
+            self.server.slots.acquire()
+        try:
+            status, headers, _ = self.request('POST', '/solve', self.screenshot)
+        finally:
+            for _ in range(2):
+                self.server.slots.release()
+
+        self.assertEqual(503, status)
+        self.assertEqual('1', headers['Retry-After'])
+        self.assertEqual(200, self.request('POST', '/solve', self.screenshot)[0])
+
+    def test_worker_restart(self):
+        # A dead worker breaks the pool, which has to be replaced instead of failing all further requests:
+        broken = self.server.executor
+        broken.submit(os._exit, 1)
+        status, headers, _ = self.request('POST', '/solve', self.screenshot)
+
+        self.assertEqual(503, status)
+        self.assertEqual('1', headers['Retry-After'])
+        self.assertIsNot(broken, self.server.executor)
+        self.assertEqual(200, self.request('POST', '/solve', self.screenshot)[0])
+
+    def test_parse_args(self):
+        args = parse_args(['--port', '0', '--workers', '3', '--queue-size', '0'])
+        self.assertEqual((0, 3, 0, 'json'), (args.port, args.workers, args.queue_size, args.format))
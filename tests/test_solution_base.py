@@ -1,6 +1,6 @@
 import unittest
 import numpy as np
-from src.solution_base import State, create_initial_ordering
+from src.solution_base import State, SwapLog, create_initial_ordering, swaps_from_states
 
 
 class TestState(unittest.TestCase):
@@ -34,3 +34,62 @@ class TestState(unittest.TestCase):
         self.assertTrue(State(ordering, colouring).is_sane())
         self.assertFalse(State(ordering_broken, colouring).is_sane())
         self.assertFalse(State(ordering, colouring_broken).is_sane())
+
+    def test_get_duplicates(self):
+        # Duplicates are reported as tuples in the order of their first appearance:
+        ordering = create_initial_ordering(np.zeros((3, 4, 2)))
+        ordering[2, 3] = ordering[1, 1]
+        ordering[2, 2] = ordering[0, 2]
+        colouring = np.arange(36).reshape((3, 4, 3)) - 10
+        colouring[1, 0] = colouring[2, 1] = colouring[0, 3]
+
+        state = State(ordering, colouring)
+        self.assertEqual(
+            {'coord_pair_duplicates': [(0, 2), (1, 1)], 'colour_duplicates': [(-1, 0, 1)]},
+            state.get_duplicates(),
+        )
+        self.assertFalse(state.is_sane())
+
+        # The result is cached, until the colouring gets replaced:
+        self.assertIs(state.get_duplicates(), state.get_duplicates())
+        state.colouring = np.arange(36, dtype=float).reshape((3, 4, 3))
+        self.assertEqual([], state.get_duplicates()['colour_duplicates'])
+
+    def test_swap_log(self):
+        colouring = np.arange(2 * 3 * 3).reshape((2, 3, 3))
+        swaps = np.asarray([[0, 0, 1, 2], [0, 1, 0, 0], [1, 1, 1, 2]])
+        swap_log = SwapLog(colouring, swaps)
+
+        # Replay the swaps by hand to get the expected states:
+        expected = []
+        ordering = create_initial_ordering(colouring[:, :, :2])
+        current_colouring = colouring.copy()
+        for i, j, i_in, j_in in swaps.tolist():
+            ordering[[i, i_in], [j, j_in]] = ordering[[i_in, i], [j_in, j]]
+            current_colouring[[i, i_in], [j, j_in]] = current_colouring[[i_in, i], [j_in, j]]
+            expected.append(State(ordering.copy(), current_colouring.copy(), swapped_elements=[(i, j), (i_in, j_in)]))
+
+        self.assertEqual(3, len(swap_log))
+        self.assertTrue((swaps == swaps_from_states(swap_log)).all())
+        self.assertTrue((swaps == swaps_from_states(expected)).all())
+
+        def assert_same(state, expected_state, idx):
+            self.assertEqual(idx, state.idx)
+            self.assertEqual(expected_state.swapped_elements, state.swapped_elements)
+            self.assertTrue((expected_state.ordering == state.ordering).all())
+            self.assertTrue((expected_state.colouring == state.colouring).all())
+            self.assertTrue(state.is_sane())
+
+        # Iteration, forward and backward random access as well as slicing have to agree:
+        for k, state in enumerate(swap_log):
+            assert_same(state, expected[k], k)
+        for k in [2, 0, 1, -1]:
+            assert_same(swap_log[k], expected[k], k % 3)
+        for k, state in enumerate(swap_log[1:]):
+            assert_same(state, expected[k + 1], k + 1)
+
+        with self.assertRaises(IndexError):
+            swap_log[3]
+
+        # The initial colouring must not be touched:
+        self.assertTrue((np.arange(2 * 3 * 3).reshape((2, 3, 3)) == colouring).all())
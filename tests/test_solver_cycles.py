@@ -0,0 +1,61 @@
+import unittest
+import numpy as np
+from src.solver_cycles import cycle_decomposition, cycle_method, cycle_swaps, minimum_swap_count
+from src.solver_naive import naive_swaps
+from benchmarks.bench_solver_naive import random_final_ordering
+
+
+class TestCycleMethod(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.initial_colouring = np.asarray(
+            [
+                [[0, 0, 0], [240, 240, 240], [40, 40, 40]], 
+                [[120, 120, 120], [200, 200, 200], [80, 80, 80]], 
+                [[160, 160, 160], [100, 100, 100], [255, 255, 255]]
+            ]
+        )
+        self.final_ordering = np.asarray(
+            [
+                [[0, 0], [0, 2], [1, 2]],
+                [[2, 1], [1, 0], [2, 0]],
+                [[1, 1], [0, 1], [2, 2]]
+            ]
+        )
+        return super().setUp()
+
+    def test_cycle_decomposition(self):
+        # In flat indices, position 1 receives tile 2, 2 receives 5, 5 receives 6, ... :
+        self.assertEqual(
+            [[0], [1, 2, 5, 6, 4, 3, 7], [8]],
+            cycle_decomposition(self.final_ordering)
+        )
+        self.assertEqual(9 - 3, minimum_swap_count(self.final_ordering))
+
+    def test_cycle_method_synthetic(self):
+        with self.assertLogs('solver_cycles', level='INFO') as logs:
+            states = cycle_method(self.initial_colouring, self.final_ordering)
+
+        naive_steps = len(naive_swaps(self.final_ordering))
+        self.assertIn(f'in {len(states)} steps vs {naive_steps} naive', logs.output[-1])
+
+        self.assertEqual(minimum_swap_count(self.final_ordering), len(states))
+        for state in states:
+            self.assertTrue(state.is_sane())
+
+        # Has the final state reached the final ordering?
+        self.assertTrue((self.final_ordering == states[-1].ordering).all())
+
+    def test_cycle_method_random(self):
+        for N_i, N_j, seed in [(1, 1, 0), (8, 10, 1), (13, 7, 2)]:
+            final_ordering = random_final_ordering(N_i, N_j, seed=seed)
+            initial_colouring = np.random.default_rng(seed).permutation(N_i * N_j * 3).reshape((N_i, N_j, 3))
+            states = cycle_method(initial_colouring, final_ordering)
+
+            # Never more steps than the naive method and exactly the minimum:
+            self.assertEqual(minimum_swap_count(final_ordering), len(states))
+            self.assertLessEqual(len(states), len(naive_swaps(final_ordering)))
+            self.assertEqual((len(states), 4), cycle_swaps(final_ordering).shape)
+
+            if len(states) > 0:
+                self.assertTrue((final_ordering == states[-1].ordering).all())
@@ -2,7 +2,8 @@ import unittest
 import numpy as np
 from src.image_manipulation import Image
 from src.solution_base import Solution
-from src.solver_naive import naive_method
+from src.solver_naive import naive_method, naive_swaps
+from benchmarks.bench_solver_naive import argwhere_swaps, random_final_ordering
 
 
 class TestNaiveMethod(unittest.TestCase):
@@ -49,3 +50,34 @@ class TestNaiveMethod(unittest.TestCase):
 
         # Has the final state reached the final ordering?
         self.assertTrue((final_ordering == states[-1].ordering).all())
+
+    def test_naive_swaps_match_argwhere_search(self):
+        # The inverse index must not change the sequence of swaps compared to searching the ordering:
+        for N_i, N_j, seed in [(3, 3, 0), (8, 10, 1), (13, 7, 2)]:
+            final_ordering = random_final_ordering(N_i, N_j, seed=seed)
+            swaps = naive_swaps(final_ordering)
+
+            self.assertEqual((len(swaps), 4), swaps.shape)
+            self.assertTrue((argwhere_swaps(final_ordering) == swaps).all())
+
+        # Nothing to do for the identity:
+        self.assertEqual((0, 4), naive_swaps(random_final_ordering(1, 1)).shape)
+
+    def test_debug_logging(self):
+        # The debug output is only formatted when it is switched on, but then has to be the same as before:
+        final_ordering = random_final_ordering(4, 5, seed=3)
+        initial_colouring = np.arange(60).reshape((4, 5, 3))
+
+        with self.assertLogs('solver_naive', level='DEBUG') as logs:
+            states = naive_method(initial_colouring, final_ordering)
+
+        self.assertIn(f'Swapping history: {[state.swapped_elements for state in states]}', logs.output[-1])
+        # Seven lines per swap, one per tile already in place, the summary and the history:
+        self.assertEqual(7 * len(states) + (20 - len(states)) + 2, len(logs.output))
+
+        # The dumps rebuilt from the flat indices have to show the same matrices as the states:
+        after_ordering = [line for line in logs.output if 'After switching, ordering' in line]
+        after_colouring = [line for line in logs.output if 'After switching, colouring' in line]
+        for state, ordering, colouring in zip(states, after_ordering, after_colouring):
+            self.assertTrue(ordering.endswith(str(state.ordering)))
+            self.assertTrue(colouring.endswith(str(state.colouring)))
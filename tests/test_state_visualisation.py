@@ -0,0 +1,169 @@
+import io
+import json
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+import numpy as np
+from PIL import Image as PILImage
+from PIL import ImageDraw as PILImageDraw
+from PIL import ImageSequence as PILImageSequence
+from src.solver_naive import naive_method
+from src.solution_base import State, SwapLog
+from src.state_visualisation import (
+    StateRenderer, _generate_state_image, _line_coordinates, generate_solution_gif, read_solution_swaps, solution_to_bytes,
+    write_solution,
+    write_solution_apng, write_solution_gif, write_solution_json, write_solution_swaps, write_solution_webp,
+)
+from benchmarks.bench_solver_naive import random_final_ordering
+
+
+def reference_state_image(state, cell_size):
+    # Straightforward cell-by-cell rendering to compare against:
+    N_i, N_j, _ = state.colouring.shape
+    m = np.zeros((N_i * cell_size, N_j * cell_size, 3), dtype=int)
+    for i in range(N_i):
+        for j in range(N_j):
+            m[i*cell_size:(i+1)*cell_size-1, j*cell_size:(j+1)*cell_size-1, :] = state.colouring[i, j, :]
+
+    im = PILImage.fromarray(np.uint8(np.swapaxes(m, 0, 1)))
+    PILImageDraw.Draw(im).line(_line_coordinates(state, cell_size), fill=0, width=cell_size // 25)
+    return np.asarray(im)
+
+
+class TestStateVisualisation(unittest.TestCase):
+
+    def setUp(self) -> None:
+        colouring = np.random.default_rng(0).integers(0, 256, (5, 4, 3))
+        self.steps = naive_method(colouring, random_final_ordering(5, 4))
+        return super().setUp()
+
+    def test_full_render(self):
+        for step in self.steps:
+            self.assertTrue((reference_state_image(step, 60) == np.asarray(_generate_state_image(step))).all())
+
+    def test_incremental_render(self):
+        renderer = StateRenderer(cell_size=50)
+        for step in self.steps:
+            frame = renderer.render(step)
+            self.assertEqual((200, 250, 3), frame.shape)
+            self.assertTrue((reference_state_image(step, 50) == frame).all())
+
+    def test_incremental_render_far_apart_swaps(self):
+        colouring = np.random.default_rng(1).integers(0, 256, (6, 6, 3))
+        renderer = StateRenderer(cell_size=30)
+        for swap in [((0, 0), (5, 5)), ((5, 0), (0, 5)), ((2, 3), (2, 4)), ((0, 5), (5, 5))]:
+            (i, j), (i_in, j_in) = swap
+            colouring[[i, i_in], [j, j_in]] = colouring[[i_in, i], [j_in, j]]
+            state = State(None, colouring.copy(), swap)
+            frame = renderer.render(state)
+            self.assertTrue((reference_state_image(state, 30) == frame).all())
+
+            left, upper, right, lower = renderer.dirty_box
+            self.assertTrue(left <= min(i, i_in) * 30 and right >= (max(i, i_in) + 1) * 30)
+            self.assertTrue(upper <= min(j, j_in) * 30 and lower >= (max(j, j_in) + 1) * 30)
+
+    def test_streaming_gif(self):
+        fp = io.BytesIO()
+        write_solution_gif(self.steps, fp, duration=40, cell_size=20)
+
+        gif = PILImage.open(io.BytesIO(fp.getvalue()))
+        self.assertEqual(len(self.steps), gif.n_frames)
+        self.assertEqual(0, gif.info['loop'])
+        self.assertEqual(40, gif.info['duration'])
+
+        # Every frame has to look exactly like the state image rendered from scratch:
+        for step, frame in zip(self.steps, PILImageSequence.Iterator(gif)):
+            self.assertTrue(
+                (np.asarray(_generate_state_image(step, cell_size=20)) == np.asarray(frame.convert('RGB'))).all()
+            )
+
+    def test_animations_without_steps(self):
+        # An already solved puzzle is shown as a single frame of its initial state:
+        solved = SwapLog(self.steps.initial_colouring, np.zeros((0, 4), dtype=int))
+        expected = np.asarray(_generate_state_image(solved.initial_state(), cell_size=20))
+        for writer in (write_solution_gif, write_solution_webp, write_solution_apng):
+            fp = io.BytesIO()
+            writer(solved, fp, cell_size=20)
+
+            animation = PILImage.open(io.BytesIO(fp.getvalue()))
+            self.assertEqual(1, getattr(animation, 'n_frames', 1))
+            self.assertTrue((expected == np.asarray(animation.convert('RGB'))).all())
+
+            # Without any state, there is nothing to render:
+            with self.assertRaises(ValueError):
+                writer([], io.BytesIO())
+
+    def test_animations(self):
+        # Both are lossless, so each frame should be the state image:
+        for writer in (write_solution_webp, write_solution_apng):
+            fp = io.BytesIO()
+            writer(self.steps, fp, duration=40, cell_size=20)
+
+            animation = PILImage.open(io.BytesIO(fp.getvalue()))
+            self.assertEqual(len(self.steps), animation.n_frames)
+            for step, frame in zip(self.steps, PILImageSequence.Iterator(animation)):
+                self.assertTrue(
+                    (np.asarray(_generate_state_image(step, cell_size=20)) == np.asarray(frame.convert('RGB'))).all()
+                )
+
+    def test_move_lists(self):
+        # SwapLogs and plain lists of states have to give the same result:
+        for steps in (self.steps, list(self.steps)):
+            fp = io.BytesIO()
+            write_solution_json(steps, fp, duration=40)
+            solution = json.loads(fp.getvalue())
+            self.assertEqual([5, 4], solution['tiling'])
+            self.assertEqual(self.steps.initial_colouring.tolist(), solution['initial_colouring'])
+            self.assertEqual(self.steps.swaps.tolist(), solution['swaps'])
+            self.assertEqual(40, solution['duration'])
+
+            fp = io.BytesIO()
+            write_solution_swaps(steps, fp, duration=40)
+            initial_colouring, swaps, duration = read_solution_swaps(io.BytesIO(fp.getvalue()))
+            self.assertTrue((self.steps.initial_colouring == initial_colouring).all())
+            self.assertTrue((self.steps.swaps == swaps).all())
+            self.assertEqual(40, duration)
+
+        # An already solved puzzle still gives a valid move list, without swaps:
+        solved = SwapLog(self.steps.initial_colouring, np.zeros((0, 4), dtype=int))
+        fp = io.BytesIO()
+        write_solution_json(solved, fp)
+        self.assertEqual([], json.loads(fp.getvalue())['swaps'])
+
+        fp = io.BytesIO()
+        write_solution_swaps(solved, fp)
+        initial_colouring, swaps, _ = read_solution_swaps(io.BytesIO(fp.getvalue()))
+        self.assertTrue((self.steps.initial_colouring == initial_colouring).all())
+        self.assertEqual((0, 4), swaps.shape)
+
+        # Without any state, the initial colouring is unknown:
+        for writer in (write_solution_json, write_solution_swaps):
+            with self.assertRaises(ValueError):
+                writer([], io.BytesIO())
+
+        with self.assertRaises(ValueError):
+            read_solution_swaps(io.BytesIO(b'GIF89a' + bytes(20)))
+
+    def test_write_solution(self):
+        # The generic writer dispatches on the format and defaults to one ms per frame and step:
+        fp = io.BytesIO()
+        write_solution(self.steps, fp, output_format='json')
+        self.assertEqual(len(self.steps), json.loads(fp.getvalue())['duration'])
+        self.assertEqual(fp.getvalue(), solution_to_bytes(self.steps, output_format='json'))
+
+        fp = io.BytesIO()
+        write_solution_gif(self.steps, fp, duration=len(self.steps))
+        self.assertEqual(fp.getvalue(), solution_to_bytes(self.steps))
+
+        with self.assertRaises(ValueError):
+            solution_to_bytes(self.steps, output_format='bmp')
+
+    def test_generate_solution_gif_creates_output_dir(self):
+        solution = SimpleNamespace(steps=self.steps, image=SimpleNamespace(file_name='some/dir/test.jpeg'))
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            output_dir = os.path.join(tmp_dir, 'not', 'there')
+            generate_solution_gif(solution, output_format='swaps', output_dir=output_dir)
+
+            with open(os.path.join(output_dir, 'test.jpeg.swaps'), 'rb') as fp:
+                self.assertEqual(solution_to_bytes(self.steps, output_format='swaps'), fp.read())